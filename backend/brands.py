@@ -0,0 +1,37 @@
+import threading
+
+from backend.cache import cache_version
+from backend.models import Site
+
+BRANDS_CACHE_NAMESPACE = 'brands'
+
+
+class BrandRegistry:
+    """Genders and display names of every brand, loaded from Site once per process.
+
+    Site saves bump the shared 'brands' cache version so every process reloads on its next lookup.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.brands = {}
+
+    def get(self, name):
+        version = cache_version(BRANDS_CACHE_NAMESPACE)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.brands = self.load()
+                    self.version = version
+        return self.brands.get(name)
+
+    def load(self):
+        brands = {}
+        for name, display_name, gender in Site.objects.values_list('name', 'display_name', 'gender'):
+            brand = brands.setdefault(name, {'display_name': display_name, 'genders': set()})
+            brand['genders'].add(gender)
+        return brands
+
+
+brand_registry = BrandRegistry()
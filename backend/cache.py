@@ -0,0 +1,36 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
+
+
+def cache_version(namespace):
+    # Seeded from the clock so an evicted version never brings back keys of an older generation.
+    return cache.get_or_set('version:{0}'.format(namespace), int(time.time() * 1000), None)
+
+
+def bump_cache_version(namespace):
+    """Invalidate every key made by versioned_key for the namespace."""
+    try:
+        cache.incr('version:{0}'.format(namespace))
+    except ValueError:
+        cache.set('version:{0}'.format(namespace), int(time.time() * 1000), None)
+
+
+def versioned_key(namespace, *parts):
+    # Parts may hold spaces or be long, memcached accepts neither in keys.
+    digest = hashlib.md5(force_bytes(':'.join(str(part) for part in parts))).hexdigest()
+    return '{0}:{1}:{2}'.format(namespace, cache_version(namespace), digest)
+
+
+def cached(key, load, timeout):
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        cache.set(key, value, timeout)
+    return value
+
+
+def board_info_key(username, slug):
+    return versioned_key('board_info', username, slug)
@@ -0,0 +1,116 @@
+import logging
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+
+# Crawls flush new image references in batches, queued files are kept at least this long.
+IMAGE_CLEANUP_GRACE_SECONDS = 6 * 60 * 60
+
+# Every image path referenced by products (small, hq and derivatives) and boards, one row per reference.
+IMAGE_REFERENCES_SQL = """
+    select image_filename path from products where image_filename is not null
+    union all
+    select hq_image_filename from products where hq_image_filename is not null
+    union all
+    select d.value
+    from products p,
+         jsonb_each(p.image_derivatives) f,
+         jsonb_each_text(f.value) d
+    where p.image_derivatives is not null
+    union all
+    select image_filename from boards where image_filename <> ''
+    """
+
+
+def product_image_paths(image_filename, hq_image_filename, image_derivatives):
+    paths = [image_filename, hq_image_filename]
+    for derivative_paths in (image_derivatives or {}).values():
+        paths += derivative_paths.values()
+    return [path for path in paths if path]
+
+
+def add_image_refs(paths):
+    change_image_refs(Counter(paths))
+
+
+def remove_image_refs(paths):
+    change_image_refs({path: -count for path, count in Counter(paths).items()})
+
+
+def change_image_refs(deltas):
+    """Apply reference count deltas ({path: delta}) to the image store.
+
+    Images are stored once per content hash and shared by products and boards; once a reference
+    count drops to zero the file is queued for drain_image_cleanup to unlink.
+    """
+    deltas = {path: delta for path, delta in deltas.items() if path and delta}
+    if not deltas:
+        return []
+    values = ', '.join(['(%s, %s)'] * len(deltas))
+    params = []
+    # A fixed row order keeps concurrent crawls sharing images from deadlocking on image_store.
+    for path, delta in sorted(deltas.items()):
+        params += [path, delta]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                insert into image_store (path, refcount) values {0}
+                on conflict (path) do update set refcount = image_store.refcount + excluded.refcount
+                """.format(values), params)
+            cursor.execute("delete from image_store where path = any(%s) and refcount <= 0 returning path",
+                           [list(deltas)])
+            orphans = [row[0] for row in cursor.fetchall()]
+            enqueue_image_cleanup(cursor, orphans)
+            referenced = [path for path, delta in deltas.items() if delta > 0]
+            if referenced:
+                cursor.execute("delete from image_cleanup_queue where path = any(%s)", [referenced])
+    return orphans
+
+
+def enqueue_image_cleanup(cursor, paths):
+    if not paths:
+        return
+    cursor.execute("""
+        insert into image_cleanup_queue (path, created_at)
+        select path, now() from unnest(%s::varchar[]) path
+        on conflict (path) do update set created_at = excluded.created_at
+        """, [list(paths)])
+
+
+def drain_image_cleanup(batch_size, grace_seconds=IMAGE_CLEANUP_GRACE_SECONDS):
+    """Unlink up to batch_size queued images and return how many queue entries were handled.
+
+    Only entries older than grace_seconds are taken: a running crawl may reuse a content-addressed
+    file before its pipeline flushes the new reference. Paths referenced again since they were queued
+    are dropped from the queue and kept on disk.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                delete from image_cleanup_queue
+                where id in (select id from image_cleanup_queue
+                             where created_at < now() - %s * interval '1 second'
+                             order by id limit %s for update skip locked)
+                returning path
+                """, [grace_seconds, batch_size])
+            paths = [row[0] for row in cursor.fetchall()]
+            if not paths:
+                return 0
+            cursor.execute("select path from image_store where path = any(%s) and refcount > 0", [paths])
+            live = set(row[0] for row in cursor.fetchall())
+        remove_image_files([path for path in paths if path not in live])
+    return len(paths)
+
+
+def remove_image_files(paths):
+    logger = logging.getLogger(__name__)
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(os.path.join(settings.IMAGES_ROOT, path))
+            removed += 1
+        except FileNotFoundError:
+            logger.warning('The image does not exist: {0}'.format(path))
+    return removed
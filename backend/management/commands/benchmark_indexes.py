@@ -0,0 +1,128 @@
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from backend.models import Product
+
+BENCH_TABLES = ['sites', 'products', 'product_love', 'board_product', 'brand_followers']
+
+# Indexes Django creates today: primary keys, product_link unique and one index per foreign key.
+BASELINE_INDEXES = [
+    "create unique index on bench_sites (id)",
+    "create unique index on bench_products (id)",
+    "create unique index on bench_products (product_link)",
+    "create index on bench_products (site_id)",
+    "create unique index on bench_product_love (id)",
+    "create index on bench_product_love (user_id)",
+    "create index on bench_product_love (product_id)",
+    "create unique index on bench_board_product (id)",
+    "create index on bench_board_product (user_id)",
+    "create index on bench_board_product (product_id)",
+    "create index on bench_board_product (board_id)",
+    "create unique index on bench_brand_followers (id)",
+    "create index on bench_brand_followers (user_id)",
+]
+
+# Mirrors the Meta.indexes declared in backend.models.
+FEED_INDEXES = [
+    "create index on bench_sites (type, gender)",
+    "create index on bench_products (shuffle_key, id)",
+    "create index on bench_products (inserted_at desc, id desc)",
+    "create index on bench_products (site_id, inserted_at desc)",
+    "create index on bench_product_love (user_id, product_id)",
+    "create index on bench_board_product (user_id, product_id)",
+    "create index on bench_board_product (board_id, product_id)",
+    "create index on bench_brand_followers (user_id, brand_name)",
+    "create index on bench_brand_followers (brand_name, user_id)",
+]
+
+QUERIES = [
+    ('today feed', """
+        select p.* from bench_products p
+                 left join bench_sites s on p.site_id = s.id
+        where s.type = 1 and s.gender = 1 and p.inserted_at >= now() - interval '1 day'
+        order by p.inserted_at desc, p.id desc limit 60
+        """),
+    ('shuffled feed', """
+        select p.* from bench_products p
+                 left join bench_sites s on p.site_id = s.id
+        where s.type = 1 and s.gender = 1
+        order by p.shuffle_key, p.id limit 60
+        """),
+    ('following feed', """
+        select p.* from bench_products p
+                 left join bench_sites s on s.id = p.site_id
+                 left join bench_brand_followers bf on bf.brand_name = s.name
+        where bf.user_id = 1 and s.type = 1
+        order by p.inserted_at desc, p.id desc limit 60
+        """),
+    ('loved ids', "select product_id from bench_product_love where user_id = 1"),
+    ('saved ids', "select product_id from bench_board_product where user_id = 1"),
+    ('brand followers', """
+        select count(*), bool_or(user_id = 1) from bench_brand_followers where brand_name = 'brand1'
+        """),
+]
+
+
+class Command(BaseCommand):
+    help = "Show EXPLAIN plans of the feed queries before and after the feed indexes on a synthetic dataset. " \
+           "Everything runs on temporary tables and is dropped at the end."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200000, help='number of synthetic products')
+        parser.add_argument('--sites', type=int, default=80, help='number of synthetic sites')
+        parser.add_argument('--users', type=int, default=1000, help='number of synthetic users')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for table in BENCH_TABLES:
+                    cursor.execute("create temp table bench_{0} (like {0}) on commit drop".format(table))
+                self.populate(cursor, options['products'], options['sites'], options['users'])
+                for sql in BASELINE_INDEXES:
+                    cursor.execute(sql)
+                self.explain(cursor, 'BEFORE')
+                for sql in FEED_INDEXES:
+                    cursor.execute(sql)
+                self.explain(cursor, 'AFTER')
+
+    def populate(self, cursor, products, sites, users):
+        cursor.execute("""
+            insert into bench_sites (id, name, display_name, scrape_url, short_url, gender, type, inserted_at, updated_at)
+            select g, 'brand' || (g / 4), 'Brand ' || (g / 4), 'https://example.com', 'example.com',
+                   1 + (g %% 2), 1 + ((g / 2) %% 2), now(), now()
+            from generate_series(1, %s) g
+            """, [sites])
+        cursor.execute("""
+            insert into bench_products (id, title, image_filename, price, product_link, status, shuffle_key,
+                                        check_interval, site_id, inserted_at, updated_at)
+            select g, 'Product ' || g, 'full/' || md5(g::text) || '.jpg', '$10.00', 'https://example.com/p/' || g,
+                   200, floor(random() * 2147483647), %s, 1 + (g %% %s), now() - random() * interval '365 days', now()
+            from generate_series(1, %s) g
+            """, [Product.CHECK_INTERVAL_MIN_DAYS, sites, products])
+        cursor.execute("""
+            insert into bench_product_love (id, user_id, product_id)
+            select g, 1 + (g %% %s), 1 + floor(random() * %s)
+            from generate_series(1, %s) g
+            """, [users, products, users * 20])
+        cursor.execute("""
+            insert into bench_board_product (id, board_id, product_id, user_id, created_at)
+            select g, 1 + (g %% (%s * 3)), 1 + floor(random() * %s), 1 + (g %% %s), now() - random() * interval '30 days'
+            from generate_series(1, %s) g
+            """, [users, products, users, users * 20])
+        cursor.execute("""
+            insert into bench_brand_followers (id, brand_name, user_id)
+            select g, 'brand' || floor(random() * %s / 4), 1 + (g %% %s)
+            from generate_series(1, %s) g
+            """, [sites, users, users * 5])
+        for table in BENCH_TABLES:
+            cursor.execute("analyze bench_{0}".format(table))
+
+    def explain(self, cursor, label):
+        for table in BENCH_TABLES:
+            cursor.execute("analyze bench_{0}".format(table))
+        for name, sql in QUERIES:
+            self.stdout.write(self.style.MIGRATE_HEADING('{0}: {1}'.format(label, name)))
+            cursor.execute("explain (analyze, buffers) " + sql)
+            for row in cursor.fetchall():
+                self.stdout.write(row[0])
+            self.stdout.write('')
@@ -0,0 +1,28 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from backend.images import drain_image_cleanup, IMAGE_CLEANUP_GRACE_SECONDS
+
+
+class Command(BaseCommand):
+    help = "Unlink the image files queued for cleanup by product and board deletes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='queue entries handled per transaction')
+        parser.add_argument('--loop', action='store_true', help='keep running and poll the queue')
+        parser.add_argument('--sleep', type=int, default=30, help='seconds to wait when the queue is empty')
+        parser.add_argument('--grace', type=int, default=IMAGE_CLEANUP_GRACE_SECONDS,
+                            help='seconds an image stays queued before it is unlinked')
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        while True:
+            drained = drain_image_cleanup(options['batch_size'], options['grace'])
+            if drained:
+                logger.info('{0} queued images cleaned up.'.format(drained))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,22 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from backend.images import IMAGE_REFERENCES_SQL
+
+
+class Command(BaseCommand):
+    help = "Recount the references of every stored image from products and boards"
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("delete from image_store")
+                cursor.execute("""
+                    insert into image_store (path, refcount)
+                    select path, count(*) from ({0}) refs group by path
+                    """.format(IMAGE_REFERENCES_SQL))
+                image_count = cursor.rowcount
+        logger.info('{0} stored images counted.'.format(image_count))
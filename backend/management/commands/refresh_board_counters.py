@@ -0,0 +1,36 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized follower and today's newest counters on boards"
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        today = timezone.now().date()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    update boards b
+                    set followers_count = COALESCE(bf.followers, 0)
+                    from boards b2
+                             left join (select board_id, count(board_id) followers
+                                        from board_follower
+                                        group by board_id) bf on bf.board_id = b2.id
+                    where b.id = b2.id
+                    """)
+                cursor.execute("""
+                    update boards b
+                    set newest_count = COALESCE(bp.newest, 0), newest_date = %s
+                    from boards b2
+                             left join (select board_id, count(product_id) newest
+                                        from board_product
+                                        where created_at::date = %s
+                                        group by board_id) bp on bp.board_id = b2.id
+                    where b.id = b2.id
+                    """, [today, today])
+                board_count = cursor.rowcount
+        logger.info('Board counters refreshed for {0} boards.'.format(board_count))
@@ -0,0 +1,36 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from backend.utils import invalidate_feed_pages
+
+
+class Command(BaseCommand):
+    help = "Re-randomize the shuffle keys used to order random product and board feeds. Run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-unshuffled', action='store_true',
+                            help='only shuffle when every product or board shares one shuffle key, '
+                                 'as right after the column is added')
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if options['if_unshuffled'] and not self.unshuffled(cursor):
+                    return
+                cursor.execute("update products set shuffle_key = floor(random() * 2147483647)")
+                product_count = cursor.rowcount
+                cursor.execute("update boards set shuffle_key = floor(random() * 2147483647)")
+                board_count = cursor.rowcount
+        invalidate_feed_pages()
+        logger.info('Shuffled {0} products and {1} boards.'.format(product_count, board_count))
+
+    def unshuffled(self, cursor):
+        # min and max are single lookups on the shuffle indexes.
+        cursor.execute("""
+            select (select min(shuffle_key) = max(shuffle_key) from products),
+                   (select min(shuffle_key) = max(shuffle_key) from boards)
+            """)
+        return any(cursor.fetchone())
@@ -1,13 +1,36 @@
-import logging
-import os
+import random
 
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.migrations import AddField
 from django.db.models import JSONField
-from django.db.models.signals import post_delete
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models.signals import post_delete, post_save, post_migrate
 from django.dispatch import receiver
 from django.utils.safestring import mark_safe
 
+from backend.cache import board_info_key, bump_cache_version
+from backend.images import product_image_paths, remove_image_refs
+
+
+def random_shuffle_key():
+    return random.randint(0, 2147483647)
+
+
+@receiver(post_migrate)
+def shuffle_added_keys(sender, plan=None, **kwargs):
+    # Adding shuffle_key gives every existing row the same default, feeds would fall back to id order.
+    if sender.name != 'backend' or not plan:
+        return
+    for migration, backwards in plan:
+        if backwards or migration.app_label != 'backend':
+            continue
+        for operation in migration.operations:
+            if isinstance(operation, AddField) and operation.name == 'shuffle_key':
+                call_command('shuffle_feeds', if_unshuffled=True)
+                return
+
 
 class UserProfile(models.Model):
     GENDERS = [
@@ -45,19 +68,36 @@ class Site(models.Model):
     class Meta:
         db_table = 'sites'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['type', 'gender'], name='sites_type_gender_idx'),
+        ]
 
     def __str__(self):
         return '{0} - {1} - {2}'.format(self.display_name, self.get_gender_display(), self.get_type_display())
 
 
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def site_changed(sender, instance, **kwargs):
+    bump_cache_version('brands')
+
+
 class Product(models.Model):
+    CHECK_INTERVAL_MIN_DAYS = 1
+    CHECK_INTERVAL_MAX_DAYS = 32
+
     title = models.CharField(max_length=255)
     image_filename = models.CharField(max_length=255, null=True, blank=True)
     price = models.CharField(max_length=255)
     sale_price = models.CharField(max_length=255, null=True, blank=True)
     product_link = models.URLField(unique=True)
     hq_image_filename = models.CharField(max_length=255, null=True, blank=True)
+    image_derivatives = JSONField(null=True, blank=True)
     status = models.IntegerField(default=200)
+    shuffle_key = models.IntegerField(default=random_shuffle_key)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    next_check_at = models.DateTimeField(null=True, blank=True)
+    check_interval = models.IntegerField(default=CHECK_INTERVAL_MIN_DAYS)
 
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
 
@@ -67,6 +107,12 @@ class Product(models.Model):
     class Meta:
         db_table = 'products'
         ordering = ['-inserted_at']
+        indexes = [
+            models.Index(fields=['shuffle_key', 'id'], name='products_shuffle_idx'),
+            models.Index(fields=['-inserted_at', '-id'], name='products_inserted_idx'),
+            models.Index(fields=['site', '-inserted_at'], name='products_site_inserted_idx'),
+            models.Index(fields=['next_check_at'], name='products_next_check_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -81,22 +127,8 @@ class Product(models.Model):
 
 @receiver(post_delete, sender=Product)
 def submission_delete(sender, instance, **kwargs):
-    logger = logging.getLogger(__name__)
-
-    base_path = "/home/deploy/images"
-    image_path = "{}/{}".format(base_path, instance.image_filename)
-    hq_image_path = "{}/{}".format(base_path, instance.hq_image_filename)
-    if os.path.exists(image_path):
-        logger.info('The product image deleted.')
-        os.remove(image_path)
-    else:
-        logger.warning('The product image does not exist.')
-
-    if os.path.exists(hq_image_path):
-        logger.info('The product hq image deleted.')
-        os.remove(hq_image_path)
-    else:
-        logger.warning('The product hq image does not exist.')
+    remove_image_refs(product_image_paths(
+        instance.image_filename, instance.hq_image_filename, instance.image_derivatives))
 
 
 class BrandFollower(models.Model):
@@ -105,6 +137,10 @@ class BrandFollower(models.Model):
 
     class Meta:
         db_table = 'brand_followers'
+        indexes = [
+            models.Index(fields=['user', 'brand_name'], name='brand_followers_user_idx'),
+            models.Index(fields=['brand_name', 'user'], name='brand_followers_brand_idx'),
+        ]
 
 
 class ProductLove(models.Model):
@@ -113,6 +149,9 @@ class ProductLove(models.Model):
 
     class Meta:
         db_table = 'product_love'
+        indexes = [
+            models.Index(fields=['user', 'product'], name='product_love_user_idx'),
+        ]
 
 
 class Board(models.Model):
@@ -125,6 +164,10 @@ class Board(models.Model):
     type = models.IntegerField(choices=BOARD_TYPES)
     image_filename = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
+    shuffle_key = models.IntegerField(default=random_shuffle_key)
+    followers_count = models.IntegerField(default=0)
+    newest_count = models.IntegerField(default=0)
+    newest_date = models.DateField(null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
     created_at = models.DateTimeField(auto_now_add=True, null=True)
@@ -133,6 +176,9 @@ class Board(models.Model):
     class Meta:
         db_table = 'boards'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['shuffle_key', 'id'], name='boards_shuffle_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -145,6 +191,17 @@ class Board(models.Model):
             return ""
 
 
+@receiver(post_delete, sender=Board)
+def board_delete(sender, instance, **kwargs):
+    remove_image_refs([instance.image_filename])
+    cache.delete(board_info_key(instance.user.username, instance.slug))
+
+
+@receiver(post_save, sender=Board)
+def board_save(sender, instance, **kwargs):
+    cache.delete(board_info_key(instance.user.username, instance.slug))
+
+
 class BoardProduct(models.Model):
     board = models.ForeignKey(Board, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -155,6 +212,10 @@ class BoardProduct(models.Model):
     class Meta:
         db_table = 'board_product'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'product'], name='board_product_user_idx'),
+            models.Index(fields=['board', 'product'], name='board_product_board_idx'),
+        ]
 
 
 class BoardFollower(models.Model):
@@ -163,11 +224,52 @@ class BoardFollower(models.Model):
 
     class Meta:
         db_table = 'board_follower'
+        indexes = [
+            models.Index(fields=['user', 'board'], name='board_follower_user_idx'),
+        ]
 
     def __str__(self):
         return self.board.name
 
 
+class StoredImage(models.Model):
+    path = models.CharField(max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'image_store'
+
+    def __str__(self):
+        return self.path
+
+
+class ImageCleanup(models.Model):
+    path = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'image_cleanup_queue'
+
+    def __str__(self):
+        return self.path
+
+
+class ImageSource(models.Model):
+    url = models.URLField(max_length=2000, unique=True)
+    path = models.CharField(max_length=255)
+    checksum = models.CharField(max_length=255, null=True, blank=True)
+    etag = models.CharField(max_length=255, null=True, blank=True)
+    last_modified = models.CharField(max_length=255, null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'image_sources'
+
+    def __str__(self):
+        return self.url
+
+
 class Ticket(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField()
@@ -2,6 +2,7 @@ from django.conf import settings
 from django.contrib.auth import password_validation, authenticate, get_user_model
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
@@ -9,7 +10,7 @@ from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
 
 from backend.models import Ticket, UserProfile, Product, Board, BoardProduct, BoardFollower
-from backend.utils import send_email_with_background, make_username
+from backend.utils import send_email_with_background, make_username, change_board_followers
 
 UserModel = get_user_model()
 
@@ -264,23 +265,22 @@ class FollowBoardSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         board = Board.objects.get(slug=validated_data['slug'], user__username=validated_data['username'])
-        try:
-            board_follower = BoardFollower.objects.get(board_id=board.id, user_id=self.user.id)
-            board_follower.delete()
-            followers = BoardFollower.objects.filter(board_id=board.id).count()
-            result = {
-                'followers': followers,
-                'is_following': False
-            }
-            return result
-        except BoardFollower.DoesNotExist:
-            BoardFollower.objects.create(board_id=board.id, user_id=self.user.id)
-            followers = BoardFollower.objects.filter(board_id=board.id).count()
-            result = {
-                'followers': followers,
-                'is_following': True
-            }
-            return result
+        with transaction.atomic():
+            try:
+                board_follower = BoardFollower.objects.get(board_id=board.id, user_id=self.user.id)
+                board_follower.delete()
+                change_board_followers(board.id, -1)
+                is_following = False
+            except BoardFollower.DoesNotExist:
+                BoardFollower.objects.create(board_id=board.id, user_id=self.user.id)
+                change_board_followers(board.id, 1)
+                is_following = True
+        board.refresh_from_db(fields=['followers_count'])
+        result = {
+            'followers': board.followers_count,
+            'is_following': is_following
+        }
+        return result
 
     def validate_username(self, username):
         try:
@@ -37,8 +37,13 @@ urlpatterns = [
     path('api/tickets', TicketView.as_view())
 ]
 
-if settings.DEBUG:
+if settings.DEBUG or settings.IMAGES_ACCEL_REDIRECT_PREFIX:
+    # With an accel prefix Django only answers the conditional request and nginx sends the file.
     urlpatterns += [
         path('images/<subdir>/<filename>', ImageView.as_view()),
+    ]
+
+if settings.DEBUG:
+    urlpatterns += [
         path('emails/<name>', EmailPreview.as_view())
     ]
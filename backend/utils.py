@@ -1,10 +1,26 @@
+from datetime import datetime
 from email.mime.image import MIMEImage
 
 from django.contrib.auth.models import User
 from django.contrib.staticfiles import finders
+from django.core.cache import cache
 from django.core.mail import EmailMultiAlternatives
+from django.db import connection, transaction
+from django.db.models import F, Case, When, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from rest_framework.response import Response
 
+from backend.cache import bump_cache_version, cached, versioned_key, board_info_key
+from backend.images import product_image_paths, remove_image_refs
+from backend.models import Product, ProductLove, BoardProduct, Board
+
+LIKED_SAVED_TIMEOUT = 60 * 60
+FEED_CACHE_TIMEOUT = 5 * 60
+INFO_CACHE_TIMEOUT = 60 * 60
+
 
 def background_image():
     with open(finders.find('images/back.png'), 'rb') as f:
@@ -72,17 +88,63 @@ def make_board_list(boards):
     return board_list
 
 
-def make_product_list(products):
+def change_board_followers(board_id, delta):
+    Board.objects.filter(pk=board_id).update(followers_count=F('followers_count') + delta)
+    transaction.on_commit(lambda: invalidate_board_info(board_id))
+
+
+def invalidate_board_info(board_id):
+    for username, slug in Board.objects.filter(pk=board_id).values_list('user__username', 'slug'):
+        cache.delete(board_info_key(username, slug))
+
+
+def add_board_newest(board_id):
+    today = timezone.now().date()
+    Board.objects.filter(pk=board_id).update(
+        newest_count=Case(
+            When(newest_date=today, then=F('newest_count') + 1),
+            default=Value(1)
+        ),
+        newest_date=today
+    )
+
+
+def remove_board_newest(board_id, created_at):
+    today = timezone.now().date()
+    if created_at and created_at.date() == today:
+        Board.objects.filter(pk=board_id, newest_date=today, newest_count__gt=0).update(
+            newest_count=F('newest_count') - 1
+        )
+
+
+def loved_product_ids(user_id):
+    return cached('loved_products:{0}'.format(user_id),
+                  lambda: set(ProductLove.objects.filter(user_id=user_id).values_list('product_id', flat=True)),
+                  LIKED_SAVED_TIMEOUT)
+
+
+def saved_product_ids(user_id):
+    return cached('saved_products:{0}'.format(user_id),
+                  lambda: set(BoardProduct.objects.filter(user_id=user_id).values_list('product_id', flat=True)),
+                  LIKED_SAVED_TIMEOUT)
+
+
+def invalidate_loved_product_ids(user_id):
+    cache.delete('loved_products:{0}'.format(user_id))
+
+
+def invalidate_saved_product_ids(user_id):
+    cache.delete('saved_products:{0}'.format(user_id))
+
+
+def make_product_list(products, user):
+    return add_user_flags(serialize_products(products), user)
+
+
+def serialize_products(products):
+    """Product fields shared by every user, see add_user_flags for the per-user part."""
     product_list = []
     for product in products:
-        if product.liked is None:
-            liked = False
-        else:
-            liked = True
-        if product.saved is None:
-            saved = False
-        else:
-            saved = True
         product_list.append({
             'id': product.id,
             'title': product.title,
@@ -94,7 +156,102 @@ def make_product_list(products):
             'site': product.site_id,
             'name': product.site.name,
             'display_name': product.site.display_name,
-            'liked': liked,
-            'saved': saved
+            'srcset': make_srcset(product.image_derivatives),
         })
     return product_list
+
+
+def add_user_flags(product_list, user):
+    loved = loved_product_ids(user.id)
+    saved = saved_product_ids(user.id)
+    return [dict(product, liked=product['id'] in loved, saved=product['id'] in saved) for product in product_list]
+
+
+def invalidate_feed_pages():
+    """Drop every cached feed page, called when crawls or shuffles change the products."""
+    bump_cache_version('feed')
+
+
+def cached_feed_page(key_parts, load_page):
+    """Return the shared part of a feed page, load_page() builds it on a cache miss.
+
+    The page must not depend on the requesting user, add_user_flags is applied on top.
+    """
+    return cached(versioned_key('feed', *key_parts), load_page, FEED_CACHE_TIMEOUT)
+
+
+def make_srcset(image_derivatives):
+    if not image_derivatives:
+        return None
+    srcset = {}
+    for image_format, paths in image_derivatives.items():
+        widths = sorted(paths, key=int)
+        srcset[image_format] = ', '.join('/images/{0} {1}w'.format(paths[width], width) for width in widths)
+    return srcset
+
+
+def encode_cursor(sort_key, product_id):
+    if isinstance(sort_key, datetime):
+        sort_key = sort_key.isoformat()
+    raw = "{0}|{1}".format(sort_key, product_id)
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    raw = force_str(urlsafe_base64_decode(cursor))
+    sort_key, product_id = raw.split('|')
+    if sort_key.lstrip('-').isdigit():
+        sort_key = int(sort_key)
+    else:
+        sort_key = parse_datetime(sort_key)
+        if sort_key is None:
+            raise ValueError("invalid cursor")
+    return sort_key, int(product_id)
+
+
+def record_product_checks(product_links, status):
+    """Set the checked status of products and schedule their next check.
+
+    A product whose status didn't change since its last check is checked half as often,
+    up to Product.CHECK_INTERVAL_MAX_DAYS; anything new or changed goes back to daily checks.
+    """
+    now = timezone.now()
+    interval = """
+        case when status = %s and last_checked_at is not null then least(check_interval * 2, %s) else %s end
+        """
+    interval_params = [status, Product.CHECK_INTERVAL_MAX_DAYS, Product.CHECK_INTERVAL_MIN_DAYS]
+    sql = """
+        update products
+        set check_interval = {0},
+            next_check_at = %s + ({0}) * interval '1 day',
+            status = %s, last_checked_at = %s, updated_at = %s
+        where product_link = any(%s)
+        """.format(interval)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, interval_params + [now] + interval_params + [status, now, now, list(product_links)])
+        return cursor.rowcount
+
+
+def delete_products(product_ids):
+    """Delete products and their loves/board entries in bulk, then release their images.
+
+    Bypasses the per-row post_delete signal of Product.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    with transaction.atomic():
+        # Locked so a concurrent upsert can't swap the images between this read and the release below.
+        image_paths = []
+        for image_filename, hq_image_filename, image_derivatives in Product.objects.filter(
+                id__in=product_ids).order_by('id').select_for_update().values_list(
+                'image_filename', 'hq_image_filename', 'image_derivatives'):
+            image_paths += product_image_paths(image_filename, hq_image_filename, image_derivatives)
+        with connection.cursor() as cursor:
+            cursor.execute("delete from product_love where product_id = any(%s)", [product_ids])
+            cursor.execute("delete from board_product where product_id = any(%s)", [product_ids])
+            cursor.execute("delete from products where id = any(%s)", [product_ids])
+            deleted = cursor.rowcount
+        remove_image_refs(image_paths)
+    return deleted
+
@@ -1,19 +1,20 @@
+import hashlib
 import mimetypes
 import os
-import uuid
-from datetime import timedelta
-from shutil import copyfile
+from datetime import timedelta, datetime
 
 import facebook
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
-from django.db import connection
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseRedirect, FileResponse
 from django.shortcuts import render
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from django.utils.crypto import get_random_string
+from django.utils.http import http_date, quote_etag
 from django.views import View
 from google.auth.exceptions import GoogleAuthError
 from google.auth.transport import requests
@@ -28,13 +29,18 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from slugify import slugify
 
+from backend.brands import brand_registry
+from backend.cache import cached, board_info_key
 from backend.forms import UploadFileForm, TicketForm
+from backend.images import add_image_refs, remove_image_refs
 from backend.models import Product, UserProfile, BrandFollower, ProductLove, Board, BoardProduct, \
     BoardFollower, Ticket
 from backend.serializers import ForgotPasswordSerializer, TicketSerializer, UserSerializer, CreateBoardSerializer, \
     BoardSerializer, \
     BoardProductSerializer, FollowBoardSerializer, CustomAuthTokenSerializer, ResetPasswordSerializer
-from backend.utils import api_auth, make_username, make_board_list, make_product_list
+from backend.utils import api_auth, make_username, make_board_list, make_product_list, encode_cursor, decode_cursor, \
+    invalidate_loved_product_ids, invalidate_saved_product_ids, add_board_newest, remove_board_newest, \
+    serialize_products, add_user_flags, cached_feed_page, INFO_CACHE_TIMEOUT
 
 
 class CustomAuthToken(ObtainAuthToken):
@@ -139,105 +145,111 @@ class ProductsView(APIView):
         gender = int(request.GET.get('gender', 0))
         period = int(request.GET.get("period"))
 
+        cursor = request.GET.get('cursor')
+
         now = timezone.now()
         if period == 1:
             start_time = now.strftime("'%Y-%m-%d 00:00:00'")
             end_time = now.strftime("'%Y-%m-%d 23:59:59'")
             period_condition = "and p.inserted_at between {0} and {1}".format(start_time, end_time)
-            gender_condition = "inserted_at desc"
+            gender_condition = "p.inserted_at desc, p.id desc"
         elif period == 7:
             start_of_week = now - timedelta(days=now.weekday())
             end_of_week = start_of_week + timedelta(days=6)
             start_time = start_of_week.strftime("'%Y-%m-%d 00:00:00'")
             end_time = end_of_week.strftime("'%Y-%m-%d 23:59:59'")
             period_condition = "and p.inserted_at between {0} and {1}".format(start_time, end_time)
-            gender_condition = "random()"
+            gender_condition = "p.shuffle_key, p.id"
         else:
             period_condition = ""
-            gender_condition = "random()"
+            gender_condition = "p.shuffle_key, p.id"
 
-        user = request.user
-        offset = page_number * 60
-        if explore_all == 'true':
-            if gender == 0:
-                sql = """
-                    SELECT p.*, pl.liked, bp.saved
-                    FROM products p 
-                            LEFT JOIN sites s ON p.site_id = s.id
-                            left join (select product_id, user_id liked from product_love where user_id = %s) pl on pl.product_id = p.id
-                            left join (select product_id, user_id saved from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = p.id 
-                    WHERE s.type=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
-                    """.format(period_condition, gender_condition)
-                products = Product.objects.raw(
-                    sql,
-                    [user.id, user.id, site_type, offset])
-            else:
-                sql = """
-                    SELECT p.*, pl.liked, bp.saved
-                    FROM products p 
-                            LEFT JOIN sites s ON p.site_id = s.id
-                            left join (select product_id, user_id liked from product_love where user_id = %s) pl on pl.product_id = p.id
-                            left join (select product_id, user_id saved from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = p.id 
-                    WHERE s.type=%s AND s.gender=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
-                    """.format(period_condition, gender_condition)
-                products = Product.objects.raw(
-                    sql,
-                    [user.id, user.id, site_type, gender, offset])
-        else:
-            if gender == 0:
-                sql = """
-                    select p.*, pl.liked, bp.saved
-                    from products p
-                             left join sites s on s.id = p.site_id
-                             left join brand_followers bf on bf.brand_name = s.name
-                             left join (select product_id, user_id liked from product_love where user_id = %s) pl on pl.product_id = p.id
-                             left join (select product_id, user_id saved from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = p.id
-                    where bf.user_id = %s and s.type = %s {0} order by {1} limit 60 offset %s
-                    """.format(period_condition, gender_condition)
-                products = Product.objects.raw(
-                    sql,
-                    [user.id, user.id, user.id, site_type, offset])
+        cursor_mode = cursor is not None
+        cursor_params = []
+        if cursor:
+            try:
+                cursor_params = list(decode_cursor(cursor))
+                if isinstance(cursor_params[0], datetime) != (period == 1):
+                    raise ValueError("cursor does not match period")
+            except ValueError:
+                return Response({
+                    'message': 'Invalid cursor'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if period == 1:
+                period_condition += " and (p.inserted_at, p.id) < (%s, %s)"
             else:
-                sql = """
-                    select p.*, pl.liked, bp.saved
-                    from products p
-                             left join sites s on s.id = p.site_id
-                             left join brand_followers bf on bf.brand_name = s.name
-                             left join (select product_id, user_id liked from product_love where user_id = %s) pl on pl.product_id = p.id
-                             left join (select product_id, user_id saved from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = p.id 
-                    where bf.user_id = %s and s.type = %s and s.gender = %s {0} order by {1} limit 60 offset %s
-                    """.format(period_condition, gender_condition)
-                products = Product.objects.raw(
-                    sql,
-                    [user.id, user.id, user.id, site_type, gender, offset])
+                period_condition += " and (p.shuffle_key, p.id) > (%s, %s)"
 
-        product_list = []
-        for product in products:
-            if product.liked is None:
-                liked = False
-            else:
-                liked = True
-            if product.saved is None:
-                saved = False
+        user = request.user
+        offset = 0 if cursor_mode else page_number * 60
+
+        def load_page():
+            if explore_all == 'true':
+                if gender == 0:
+                    sql = """
+                        SELECT p.*
+                        FROM products p 
+                                LEFT JOIN sites s ON p.site_id = s.id
+                        WHERE s.type=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
+                        """.format(period_condition, gender_condition)
+                    products = Product.objects.raw(
+                        sql,
+                        [site_type] + cursor_params + [offset])
+                else:
+                    sql = """
+                        SELECT p.*
+                        FROM products p 
+                                LEFT JOIN sites s ON p.site_id = s.id
+                        WHERE s.type=%s AND s.gender=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
+                        """.format(period_condition, gender_condition)
+                    products = Product.objects.raw(
+                        sql,
+                        [site_type, gender] + cursor_params + [offset])
             else:
-                saved = True
-            product_list.append({
-                'id': product.id,
-                'title': product.title,
-                'image_filename': product.image_filename,
-                'price': product.price,
-                'sale_price': product.sale_price,
-                'product_link': product.product_link,
-                'hq_image_filename': product.hq_image_filename,
-                'site': product.site_id,
-                'name': product.site.name,
-                'display_name': product.site.display_name,
-                'liked': liked,
-                'saved': saved,
-            })
-        result = {
-            'data': product_list
-        }
+                if gender == 0:
+                    sql = """
+                        select p.*
+                        from products p
+                                 left join sites s on s.id = p.site_id
+                                 left join brand_followers bf on bf.brand_name = s.name
+                        where bf.user_id = %s and s.type = %s {0} order by {1} limit 60 offset %s
+                        """.format(period_condition, gender_condition)
+                    products = Product.objects.raw(
+                        sql,
+                        [user.id, site_type] + cursor_params + [offset])
+                else:
+                    sql = """
+                        select p.*
+                        from products p
+                                 left join sites s on s.id = p.site_id
+                                 left join brand_followers bf on bf.brand_name = s.name
+                        where bf.user_id = %s and s.type = %s and s.gender = %s {0} order by {1} limit 60 offset %s
+                        """.format(period_condition, gender_condition)
+                    products = Product.objects.raw(
+                        sql,
+                        [user.id, site_type, gender] + cursor_params + [offset])
+
+            products = list(products)
+            page = {
+                'data': serialize_products(products)
+            }
+            if cursor_mode:
+                if len(products) == 60:
+                    last = products[-1]
+                    sort_key = last.inserted_at if period == 1 else last.shuffle_key
+                    page['next_cursor'] = encode_cursor(sort_key, last.id)
+                else:
+                    page['next_cursor'] = None
+            return page
+
+        if explore_all == 'true':
+            # Pages of all brands are the same for every user, only the liked/saved flags differ.
+            # Cursor pages carry next_cursor, they must never share a key with offset pages.
+            position = ('cursor', cursor) if cursor_mode else ('page', offset)
+            page = cached_feed_page(['products', now.date(), period, site_type, gender, *position], load_page)
+        else:
+            page = load_page()
+        result = dict(page, data=add_user_flags(page['data'], user))
         return Response(result)
 
 
@@ -261,42 +273,42 @@ class ProductsByBrandView(APIView):
             start_time = start_of_week.strftime("'%Y-%m-%d 00:00:00'")
             end_time = end_of_week.strftime("'%Y-%m-%d 23:59:59'")
             period_condition = "and p.inserted_at between {0} and {1}".format(start_time, end_time)
-            gender_condition = "random()"
+            gender_condition = "p.shuffle_key, p.id"
         else:
             period_condition = ""
-            gender_condition = "random()"
+            gender_condition = "p.shuffle_key, p.id"
 
         user = request.user
 
         offset = page_number * 60
-        if gender == 0:
-            sql = """
-                SELECT p.*, pl.liked, bp.saved
-                FROM products p 
-                        LEFT JOIN sites s ON p.site_id = s.id
-                        left join (select product_id, user_id liked from product_love where user_id = %s) pl on pl.product_id = p.id
-                        left join (select product_id, user_id saved from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = p.id 
-                WHERE s.type=%s AND s.name=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
-                """.format(period_condition, gender_condition)
-
-            products = Product.objects.raw(
-                sql,
-                [user.id, user.id, site_type, name, offset])
-        else:
-            sql = """
-                SELECT p.*, pl.liked, bp.saved
-                FROM products p 
-                        LEFT JOIN sites s ON p.site_id = s.id
-                        left join (select product_id, user_id liked from product_love where user_id = %s) pl on pl.product_id = p.id
-                        left join (select product_id, user_id saved from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = p.id 
-                WHERE s.type=%s AND s.name=%s AND s.gender=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
-                """.format(period_condition, gender_condition)
-            products = Product.objects.raw(
-                sql,
-                [user.id, user.id, site_type, name, gender, offset])
-        product_list = make_product_list(products)
+
+        def load_page():
+            if gender == 0:
+                sql = """
+                    SELECT p.*
+                    FROM products p 
+                            LEFT JOIN sites s ON p.site_id = s.id
+                    WHERE s.type=%s AND s.name=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
+                    """.format(period_condition, gender_condition)
+
+                products = Product.objects.raw(
+                    sql,
+                    [site_type, name, offset])
+            else:
+                sql = """
+                    SELECT p.*
+                    FROM products p 
+                            LEFT JOIN sites s ON p.site_id = s.id
+                    WHERE s.type=%s AND s.name=%s AND s.gender=%s {0} ORDER BY {1} LIMIT 60 OFFSET %s
+                    """.format(period_condition, gender_condition)
+                products = Product.objects.raw(
+                    sql,
+                    [site_type, name, gender, offset])
+            return serialize_products(products)
+
+        product_list = cached_feed_page(['brand', now.date(), period, site_type, gender, name, offset], load_page)
         result = {
-            'data': product_list
+            'data': add_user_flags(product_list, user)
         }
         return Response(result)
 
@@ -337,28 +349,25 @@ class BrandInfoView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, name):
+        user = request.user
+        brand = brand_registry.get(name)
+        if brand is None:
+            return Response({
+                'message': 'Brand not found'
+            }, status=status.HTTP_404_NOT_FOUND)
         sql = """
-            select count(*) genders from (select gender from sites where name = %s group by gender) g
+            select count(*), coalesce(bool_or(user_id = %s), false)
+            from brand_followers
+            where brand_name = %s
             """
-        sql2 = "select display_name from sites where name = %s"
         with connection.cursor() as cursor:
-            cursor.execute(sql, [name])
-            row = cursor.fetchone()
-            cursor.execute(sql2, [name])
-            row2 = cursor.fetchone()
-
-        followers = BrandFollower.objects.filter(brand_name=name).count()
-        user = request.user
-        try:
-            BrandFollower.objects.get(brand_name=name, user_id=user.id)
-            is_following = True
-        except BrandFollower.DoesNotExist:
-            is_following = False
+            cursor.execute(sql, [user.id, name])
+            followers, is_following = cursor.fetchone()
         result = {
             'followers': followers,
             'is_following': is_following,
-            'genders': row[0],
-            'display_name': row2[0]
+            'genders': len(brand['genders']),
+            'display_name': brand['display_name']
         }
         return Response(result)
 
@@ -374,6 +383,7 @@ class ToggleLoveProduct(APIView):
         try:
             product_love = ProductLove.objects.get(product_id=product_id, user_id=user.id)
             product_love.delete()
+            invalidate_loved_product_ids(user.id)
             result = {
                 'is_love': False
             }
@@ -381,6 +391,7 @@ class ToggleLoveProduct(APIView):
 
         except ProductLove.DoesNotExist:
             ProductLove.objects.create(product_id=product_id, user_id=user.id)
+            invalidate_loved_product_ids(user.id)
             result = {
                 'is_love': True
             }
@@ -396,15 +407,15 @@ class MyLovesView(APIView):
         offset = page_number * 60
         products = Product.objects.raw(
             """
-            select p.*, pl.*, bp.saved
-            from (select product_id, user_id liked from product_love where user_id = %s) pl
-                     left join products p on p.id = pl.product_id
-                     left join (select product_id, user_id saved from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = p.id 
-            ORDER BY random() LIMIT 60 OFFSET %s
+            select p.*
+            from product_love pl
+                     inner join products p on p.id = pl.product_id
+            where pl.user_id = %s
+            ORDER BY p.shuffle_key, p.id LIMIT 60 OFFSET %s
             """,
-            [user.id, user.id, offset])
+            [user.id, offset])
 
-        product_list = make_product_list(products)
+        product_list = make_product_list(products, user)
         result = {
             'data': product_list
         }
@@ -445,45 +456,33 @@ class BoardsView(APIView):
         else:
             page_number = int(request.GET.get('page'))
             sort_type = int(request.GET.get('order'))
-            now = timezone.now()
-            start_time = now.strftime("'%Y-%m-%d 00:00:00'")
-            end_time = now.strftime("'%Y-%m-%d 23:59:59'")
+            today = timezone.now().date()
 
             if sort_type == 0:
-                order = 'random()'
+                order = 'shuffle_key, id'
             elif sort_type == 1:
                 order = 'followers desc'
             elif sort_type == 2:
                 order = 'newest desc'
             else:
-                order = 'random()'
+                order = 'shuffle_key, id'
             offset = page_number * 60
             sql = """
-                select * from (select b.id, name, type, slug, image_filename, username, COALESCE(followers, 0) followers, COALESCE(newest, 0) newest
+                select * from (select b.id, name, type, slug, image_filename, shuffle_key, username, followers_count followers,
+                       case when newest_date = %s then newest_count else 0 end newest
                 from boards b
                          left join auth_user au on b.user_id = au.id
-                         left join (select board_id, count(board_id) followers from board_follower group by board_id) bf
-                                   on b.id = bf.board_id
-                         left join (select count(product_id) newest, board_id
-                                        from board_product
-                                        where created_at between {0} and {1}
-                                        group by board_id) bp on bp.board_id = b.id
                 where b.type = 1
                 union (
-                select b.id, name, type, slug, image_filename, username, COALESCE(followers, 0) followers, COALESCE(newest, 0) newest
+                select b.id, name, type, slug, image_filename, shuffle_key, username, followers_count followers,
+                       case when newest_date = %s then newest_count else 0 end newest
                 from boards b
                          left join auth_user au on b.user_id = au.id
-                         left join (select board_id, count(board_id) followers from board_follower group by board_id) bf
-                                   on b.id = bf.board_id
-                         left join (select count(product_id) newest, board_id
-                                        from board_product
-                                        where created_at between {0} and {1}
-                                        group by board_id) bp on bp.board_id = b.id
                 where b.type = 0 and b.user_id = %s
                 )) foo
-                order by {2} limit 60 offset %s
-                """.format(start_time, end_time, order)
-            boards = Board.objects.raw(sql, [user.id, offset])
+                order by {0} limit 60 offset %s
+                """.format(order)
+            boards = Board.objects.raw(sql, [today, today, user.id, offset])
             board_list = make_board_list(boards)
             return Response({
                 'data': board_list,
@@ -497,20 +496,21 @@ class BoardsView(APIView):
         board_type = serializer.validated_data['board_type']
         product_id = serializer.validated_data['product_id']
         product = Product.objects.get(pk=product_id)
-        image_filename = product.image_filename
-        base_path = "/home/deploy/images"
-        source = "{}/{}".format(base_path, image_filename)
-        board_filename = "boards/{}".format(os.path.basename(source))
-        target = "{}/{}".format(base_path, board_filename)
-        try:
-            copyfile(source, target)
-        except IOError as e:
-            print("Unable to copy file. %s" % e)
+        # Boards share the product's stored image instead of copying it.
+        board_filename = product.image_filename or product.hq_image_filename
+        if not board_filename:
+            return Response({
+                'message': 'This product has no image.'
+            }, status=status.HTTP_400_BAD_REQUEST)
         slug = slugify(board_name)
         board = Board.objects.create(name=board_name, type=board_type, user_id=user.id, image_filename=board_filename,
                                      slug=slug)
+        add_image_refs([board_filename])
         board_serializer = BoardSerializer(board)
-        BoardProduct.objects.create(product_id=product_id, board_id=board.id, user_id=user.id)
+        with transaction.atomic():
+            BoardProduct.objects.create(product_id=product_id, board_id=board.id, user_id=user.id)
+            add_board_newest(board.id)
+        invalidate_saved_product_ids(user.id)
         return Response({
             'board': board_serializer.data,
             'saved': True
@@ -524,40 +524,28 @@ class BoardsByUsernameView(APIView):
         user = request.user
         page_number = int(request.GET.get('page'))
         offset = page_number * 60
-        now = timezone.now()
-        start_time = now.strftime("'%Y-%m-%d 00:00:00'")
-        end_time = now.strftime("'%Y-%m-%d 23:59:59'")
+        today = timezone.now().date()
 
         if user.username == username:
             sql = """
-                select b.id, name, slug, type, image_filename, username, followers, COALESCE(newest, 0) newest
+                select b.id, name, slug, type, image_filename, username, followers_count followers,
+                       case when newest_date = %s then newest_count else 0 end newest
                 from boards b
                          left join auth_user au on b.user_id = au.id
-                         left join (select board_id, count(board_id) followers from board_follower group by board_id) bf
-                                   on b.id = bf.board_id
-                         left join (select count(product_id) newest, board_id
-                                        from board_product
-                                        where created_at between {0} and {1}
-                                        group by board_id) bp on bp.board_id = b.id
                 where au.username = %s
-                order by random() limit 60 offset %s
-                """.format(start_time, end_time)
+                order by b.shuffle_key, b.id limit 60 offset %s
+                """
         else:
             sql = """
-                select b.id, name, slug, type, image_filename, username, followers, COALESCE(newest, 0) newest
+                select b.id, name, slug, type, image_filename, username, followers_count followers,
+                       case when newest_date = %s then newest_count else 0 end newest
                 from boards b
                          left join auth_user au on b.user_id = au.id
-                         left join (select board_id, count(board_id) followers from board_follower group by board_id) bf
-                                   on b.id = bf.board_id
-                         left join (select count(product_id) newest, board_id
-                                        from board_product
-                                        where created_at between {0} and {1}
-                                        group by board_id) bp on bp.board_id = b.id
                 where b.type = 1 and au.username = %s
-                order by random() limit 60 offset %s
-                """.format(start_time, end_time)
+                order by b.shuffle_key, b.id limit 60 offset %s
+                """
 
-        boards = Board.objects.raw(sql, [username, offset])
+        boards = Board.objects.raw(sql, [today, username, offset])
         board_list = make_board_list(boards)
         return Response({
             'data': board_list,
@@ -573,18 +561,16 @@ class ProductsByBoardView(APIView):
         page_number = int(request.GET.get('page'))
         offset = page_number * 60
         sql = """
-            select p.*, bp.user_id saved, pl.liked
+            select p.*
             from (select board_id, product_id from board_product where board_id = %s group by product_id, board_id) b
-                     left join (select product_id, user_id from board_product where user_id = %s group by product_id, user_id) bp on bp.product_id = b.product_id
                      left join products p on p.id = b.product_id
-                     left join (select product_id, user_id liked from product_love where user_id = %s) pl on pl.product_id = p.id 
-            order by random() LIMIT 60 OFFSET %s
+            order by p.shuffle_key, p.id LIMIT 60 OFFSET %s
             """
         products = Product.objects.raw(
             sql,
-            [board.id, user.id, user.id, offset])
+            [board.id, offset])
 
-        product_list = make_product_list(products)
+        product_list = make_product_list(products, user)
         result = {
             'data': product_list
         }
@@ -596,27 +582,34 @@ class BoardInfoView(APIView):
 
     def get(self, request, username, slug):
         user = request.user
-        board = Board.objects.get(slug=slug, user__username=username)
 
-        followers = BoardFollower.objects.filter(board__slug=slug).count()
-        try:
-            BoardFollower.objects.get(board__slug=slug, user_id=user.id)
-            is_following = True
-        except BoardFollower.DoesNotExist:
-            is_following = False
+        def load_board_info():
+            board = Board.objects.get(slug=slug, user__username=username)
+            return {
+                'id': board.id,
+                'user_id': board.user_id,
+                'name': board.name,
+                'type': board.type,
+                'image_filename': board.image_filename,
+                'description': board.description,
+                'followers': board.followers_count,
+            }
+
+        board = cached(board_info_key(username, slug), load_board_info, INFO_CACHE_TIMEOUT)
+        is_following = BoardFollower.objects.filter(board_id=board['id'], user_id=user.id).exists()
 
-        if board.user_id == user.id:
+        if board['user_id'] == user.id:
             is_mine = True
         else:
             is_mine = False
 
         result = {
-            'name': board.name,
-            'type': board.type,
-            'image_filename': board.image_filename,
-            'description': board.description,
+            'name': board['name'],
+            'type': board['type'],
+            'image_filename': board['image_filename'],
+            'description': board['description'],
             'is_mine': is_mine,
-            'followers': followers,
+            'followers': board['followers'],
             'is_following': is_following,
         }
         return Response(result)
@@ -649,6 +642,7 @@ class BoardInfoView(APIView):
     def delete(self, request, username, slug):
         user = request.user
         Board.objects.filter(slug=slug, user_id=user.id).delete()
+        invalidate_saved_product_ids(user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -665,15 +659,22 @@ class BoardImageView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             filename = file.name
             extension = filename.split(".")[-1]
-            filename = uuid.uuid4().hex
-            filename = "{0}.{1}".format(filename, extension)
-            with open("/home/deploy/images/boards/{0}".format(filename), 'wb+') as dest:
-                for chunk in file.chunks():
-                    dest.write(chunk)
-
-                board = Board.objects.get(slug=slug, user__username=username)
-                board.image_filename = "boards/{0}".format(filename)
-                board.save()
+            content_hash = hashlib.sha1()
+            for chunk in file.chunks():
+                content_hash.update(chunk)
+            filename = "boards/{0}.{1}".format(content_hash.hexdigest(), extension)
+            target = os.path.join(settings.IMAGES_ROOT, filename)
+            if not os.path.exists(target):
+                with open(target, 'wb+') as dest:
+                    for chunk in file.chunks():
+                        dest.write(chunk)
+
+            board = Board.objects.get(slug=slug, user__username=username)
+            old_filename = board.image_filename
+            board.image_filename = filename
+            board.save()
+            add_image_refs([filename])
+            remove_image_refs([old_filename])
 
             return Response({
                 'message': 'OK',
@@ -700,12 +701,18 @@ class ProductToggleSaveView(APIView):
         product = serializer.validated_data['product']
         try:
             board_product = BoardProduct.objects.get(user_id=request.user.id, board_id=board.id, product_id=product.id)
-            board_product.delete()
+            with transaction.atomic():
+                board_product.delete()
+                remove_board_newest(board.id, board_product.created_at)
+            invalidate_saved_product_ids(request.user.id)
             return Response({
                 'saved': False
             })
         except BoardProduct.DoesNotExist:
-            serializer.save(user=request.user)
+            with transaction.atomic():
+                serializer.save(user=request.user)
+                add_board_newest(board.id)
+            invalidate_saved_product_ids(request.user.id)
             return Response({
                 'saved': True
             })
@@ -718,26 +725,19 @@ class MyFollowingsView(APIView):
         user = request.user
         page_number = int(request.GET.get('page'))
         offset = page_number * 60
-        now = timezone.now()
-        start_time = now.strftime("'%Y-%m-%d 00:00:00'")
-        end_time = now.strftime("'%Y-%m-%d 23:59:59'")
+        today = timezone.now().date()
 
         sql = """
-        select b.*, bf2.followers, au.username, bf.user_id follower_id, COALESCE(bp.newest, 0) newest
+        select b.*, b.followers_count followers, au.username, bf.user_id follower_id,
+               case when b.newest_date = %s then b.newest_count else 0 end newest
         from board_follower bf
                  left join boards b on bf.board_id = b.id
-                 left join (select board_id, count(board_id) followers from board_follower group by board_id) bf2
-                           on bf2.board_id = b.id
-                 left join (select count(product_id) newest, board_id
-                            from board_product
-                            where created_at between {0} and {1}
-                            group by board_id) bp on bp.board_id = b.id
                  left join auth_user au on b.user_id = au.id
         where b.type = 1 and bf.user_id= %s
-        order by random() limit 60 offset %s
-        """.format(start_time, end_time)
+        order by b.shuffle_key, b.id limit 60 offset %s
+        """
 
-        boards = Board.objects.raw(sql, [user.id, offset])
+        boards = Board.objects.raw(sql, [today, user.id, offset])
         board_list = make_board_list(boards)
         return Response({
             'data': board_list,
@@ -781,25 +781,16 @@ class ReplyTicket(View):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_total_new_count(request):
-    now = timezone.now()
-    start_time = now.strftime("'%Y-%m-%d 00:00:00'")
-    end_time = now.strftime("'%Y-%m-%d 23:59:59'")
+    today = timezone.now().date()
 
     sql = """
-        select COALESCE(sum(bp.newest), 0) total_new
+        select COALESCE(sum(case when b.newest_date = %s then b.newest_count else 0 end), 0) total_new
         from board_follower bf
                  left join boards b on bf.board_id = b.id
-                 left join (select board_id, count(board_id) followers from board_follower group by board_id) bf2
-                           on bf2.board_id = b.id
-                 left join (select count(product_id) newest, board_id
-                            from board_product
-                            where created_at between {0} and {1}
-                            group by board_id) bp on bp.board_id = b.id
-                 left join auth_user au on b.user_id = au.id
         where b.type = 1 and bf.user_id= %s
-        """.format(start_time, end_time)
+        """
     with connection.cursor() as cursor:
-        cursor.execute(sql, [request.user.id])
+        cursor.execute(sql, [today, request.user.id])
         row = cursor.fetchone()
     return Response({
         'new_count': row[0]
@@ -808,15 +799,35 @@ def get_total_new_count(request):
 
 class ImageView(View):
     def get(self, request, subdir, filename):
+        if subdir in ('.', '..') or filename in ('.', '..'):
+            return HttpResponse(status=404)
+        image_path = os.path.join(settings.IMAGES_ROOT, subdir, filename)
         try:
-            with open("/home/deploy/images/{0}/{1}".format(subdir, filename), "rb") as f:
-                mime = mimetypes.MimeTypes().guess_type("/home/deploy/images/{0}/{1}".format(subdir, filename))[0]
-                response = HttpResponse(f.read(), content_type=mime)
-                return response
-        except IOError:
-            response = HttpResponse(status=404)
+            stat = os.stat(image_path)
+        except OSError:
+            return HttpResponse(status=404)
+
+        etag = quote_etag("{0:x}-{1:x}".format(int(stat.st_mtime), stat.st_size))
+        last_modified = int(stat.st_mtime)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
             return response
 
+        content_type = mimetypes.guess_type(image_path)[0]
+        accel_prefix = settings.IMAGES_ACCEL_REDIRECT_PREFIX
+        if accel_prefix:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = "{0}{1}/{2}".format(accel_prefix, subdir, filename)
+        else:
+            try:
+                response = FileResponse(open(image_path, 'rb'), content_type=content_type)
+            except OSError:
+                return HttpResponse(status=404)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'max-age=86400'
+        return response
+
 
 class EmailPreview(View):
     def get(self, request, name):
@@ -44,12 +44,22 @@ INSTALLED_APPS = [
     'scraping',
 ]
 
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
-#         'LOCATION': '127.0.0.1:11211',
-#     }
-# }
+# Shared between the web workers and the crawlers, local memory is only meant for development and tests.
+if os.getenv('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv('MEMCACHED_BACKEND', 'django.core.cache.backends.memcached.PyMemcacheCache'),
+            'LOCATION': os.getenv('MEMCACHED_LOCATION'),
+            'KEY_PREFIX': 'bigaray',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bigaray',
+        }
+    }
 
 MIDDLEWARE = [
     # 'django.middleware.cache.UpdateCacheMiddleware',
@@ -123,6 +133,9 @@ STATIC_URL = '/backend-static/'
 MEDIA_URL = '/uploads/'
 STATIC_ROOT = os.path.join(BASE_DIR, "backend-static")
 MEDIA_ROOT = os.path.join(BASE_DIR, "uploads")
+IMAGES_ROOT = "/home/deploy/images"
+# When set (e.g. '/protected-images/'), ImageView only sets X-Accel-Redirect and nginx sends the file
+IMAGES_ACCEL_REDIRECT_PREFIX = os.getenv('IMAGES_ACCEL_REDIRECT_PREFIX')
 
 SIMPLEUI_STATIC_OFFLINE = True
 SIMPLEUI_HOME_INFO = False
@@ -138,6 +151,8 @@ REST_FRAMEWORK = {
 
 CACHE_MIDDLEWARE_KEY_PREFIX = 'bigaray_'
 
+SCRAPYD_URL = os.getenv('SCRAPYD_URL', 'http://localhost:6800')
+
 EMAIL_BACKEND = "sendgrid_backend.SendgridBackend"
 
 SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY', '')
@@ -1,5 +1,12 @@
+from django.core.exceptions import ImproperlyConfigured
+
 from .base import *
 
+# Cache versions invalidate brands, feeds and liked/saved sets across the web workers and the
+# crawlers, a per-process local memory cache would leave them stale.
+if not os.getenv('MEMCACHED_LOCATION'):
+    raise ImproperlyConfigured('MEMCACHED_LOCATION must point to a shared memcached in production.')
+
 DEBUG = True
 
 ALLOWED_HOSTS = [
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from scraping.models import Scraper, ScraperAdmin, ProductChecker, ProductCheckerAdmin
+from scraping.models import Scraper, ScraperAdmin, ProductChecker, ProductCheckerAdmin, CrawlRun, CrawlRunAdmin
 
 admin.site.register(Scraper, ScraperAdmin)
-admin.site.register(ProductChecker, ProductCheckerAdmin)
\ No newline at end of file
+admin.site.register(ProductChecker, ProductCheckerAdmin)
+admin.site.register(CrawlRun, CrawlRunAdmin)
\ No newline at end of file
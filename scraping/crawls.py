@@ -0,0 +1,141 @@
+import logging
+import os
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+
+def scraper_domain(scraper):
+    domain = urlparse(scraper.site.scrape_url).netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    return domain
+
+
+def stalest_first(scrapers):
+    return sorted(scrapers, key=lambda scraper: (scraper.last_scraped is not None, scraper.last_scraped))
+
+
+class CrawlOrchestrator:
+    """Schedules scrapers on scrapyd through a bounded pool of concurrent crawls.
+
+    The stalest scrapers go first, at most per_domain crawls hit the same domain at once and job
+    completion is polled for all running crawls with one listjobs call.
+    """
+
+    def __init__(self, scrapyd, max_concurrent=8, per_domain=1, poll_interval=10, max_poll_failures=30,
+                 project='default'):
+        self.scrapyd = scrapyd
+        self.max_poll_failures = max_poll_failures
+        self.max_concurrent = max_concurrent
+        self.per_domain = per_domain
+        self.poll_interval = poll_interval
+        self.project = project
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, scrapers):
+        queue = stalest_first(scrapers)
+        running = {}
+        busy_domains = Counter()
+        summary = {'scheduled': 0, 'finished': 0, 'lost': 0, 'failed': 0, 'skipped': 0, 'durations': {}}
+        started_at = time.monotonic()
+        poll_failures = 0
+
+        while queue or running:
+            for scraper in list(queue):
+                if len(running) >= self.max_concurrent:
+                    break
+                domain = scraper_domain(scraper)
+                if busy_domains[domain] >= self.per_domain:
+                    continue
+                queue.remove(scraper)
+                try:
+                    scraper.start()
+                except Exception as e:
+                    self.logger.error('Scheduling {0} failed: {1}'.format(scraper.spider_name, e))
+                    summary['failed'] += 1
+                    continue
+                running[scraper.task_id] = (scraper, domain, time.monotonic())
+                busy_domains[domain] += 1
+                summary['scheduled'] += 1
+
+            if not running:
+                break
+            time.sleep(self.poll_interval)
+
+            done = self.poll(running)
+            if done is None:
+                poll_failures += 1
+                if poll_failures < self.max_poll_failures:
+                    continue
+                # Scrapyd stays unreachable, give up instead of waiting forever.
+                self.logger.error('Scrapyd unreachable for {0} polls, giving up.'.format(poll_failures))
+                done = {task_id: 'lost' for task_id in running}
+                summary['skipped'] = len(queue)
+                queue = []
+            else:
+                poll_failures = 0
+
+            for task_id, state in done.items():
+                scraper, domain, scheduled_at = running.pop(task_id)
+                busy_domains[domain] -= 1
+                summary[state] += 1
+                summary['durations'][scraper.spider_name] = time.monotonic() - scheduled_at
+
+        summary['elapsed'] = time.monotonic() - started_at
+        return summary
+
+    def poll(self, running):
+        """Return {task_id: 'finished' | 'lost'} for the running jobs that are no longer active.
+
+        Returns None when scrapyd can't be reached.
+        """
+        try:
+            jobs = self.scrapyd.list_jobs(self.project)
+        except Exception as e:
+            self.logger.warning('Polling scrapyd failed: {0}'.format(e))
+            return None
+        active = set(job['id'] for job in jobs.get('pending', []) + jobs.get('running', []))
+        finished = set(job['id'] for job in jobs.get('finished', []))
+        done = {}
+        for task_id in running:
+            if task_id in finished:
+                done[task_id] = 'finished'
+            elif task_id not in active:
+                # Scrapyd forgot the job, e.g. after a restart; don't let it hold a slot forever.
+                done[task_id] = 'lost'
+        return done
+
+
+def run_in_process(spider_names, max_concurrent=8):
+    """Crawl the spiders in this process, max_concurrent at a time, on one reactor.
+
+    Skips the scrapyd process spawn per job; pipelines share this process' database connection.
+    Returns {spider_name: crawler stats}.
+    """
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'scrapy_app.settings')
+    logger = logging.getLogger(__name__)
+    process = CrawlerProcess(get_project_settings())
+    available = set(process.spider_loader.list())
+    queue = []
+    for spider_name in spider_names:
+        if spider_name in available:
+            queue.append(spider_name)
+        else:
+            logger.warning('Spider {0} not found in the spider modules.'.format(spider_name))
+    crawlers = {}
+
+    def crawl_next(result=None):
+        if queue:
+            crawler = process.create_crawler(queue.pop(0))
+            crawlers[crawler.spidercls.name] = crawler
+            process.crawl(crawler).addBoth(crawl_next)
+        return result
+
+    for _ in range(min(max_concurrent, len(queue))):
+        crawl_next()
+    process.start()
+    return {spider_name: crawler.stats.get_stats() for spider_name, crawler in crawlers.items()}
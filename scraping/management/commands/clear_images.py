@@ -1,24 +1,71 @@
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 from django.core.management import BaseCommand
-from django.db.models import Q
+from django.db import connection
 
-from backend.models import Product
+from backend.images import IMAGE_REFERENCES_SQL, IMAGE_CLEANUP_GRACE_SECONDS
+
+
+def scan_images(root, prefix=''):
+    with os.scandir(root) as entries:
+        for entry in entries:
+            relative_path = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_images(entry.path, relative_path + '/')
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                yield relative_path, entry.path, stat.st_size, stat.st_mtime
+
+
+def remove_image(full_path):
+    try:
+        os.remove(full_path)
+        return True
+    except FileNotFoundError:
+        return False
 
 
 class Command(BaseCommand):
-    help = "Delete products having empty image field"
+    help = "Delete image files no product or board refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="only report what would be deleted")
+        parser.add_argument('--workers', type=int, default=8, help="number of parallel deletions")
 
     def handle(self, *args, **options):
         logger = logging.getLogger(__name__)
-        for path, subdirs, files in os.walk('/home/deploy/images'):
-            for name in files:
-                full_path = os.path.join(path, name)
-                full_path = full_path.replace('\\', '/')
-                image_filename = full_path.split('/home/deploy/images/')[1]
-                product_count = Product.objects.filter(
-                    Q(image_filename=image_filename) | Q(hq_image_filename=image_filename)).count()
-                if product_count == 0:
-                    os.remove(full_path)
-                    logger.info("Deleted: {0}".format(image_filename))
+        referenced = set()
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(IMAGE_REFERENCES_SQL)
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                referenced.update(row[0] for row in rows)
+
+        orphans = []
+        orphan_bytes = 0
+        # Crawls write images and derivatives before flushing the products that reference them.
+        cutoff = time.time() - IMAGE_CLEANUP_GRACE_SECONDS
+        for image_filename, full_path, size, modified_at in scan_images(settings.IMAGES_ROOT):
+            if image_filename not in referenced and modified_at < cutoff:
+                orphans.append((image_filename, full_path))
+                orphan_bytes += size
+
+        if options['dry_run']:
+            for image_filename, full_path in orphans:
+                logger.info("Would delete: {0}".format(image_filename))
+            self.stdout.write("{0} orphan images, {1} bytes would be reclaimed.".format(len(orphans), orphan_bytes))
+            return
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            removed = sum(executor.map(remove_image, [full_path for image_filename, full_path in orphans]))
+        orphan_paths = [image_filename for image_filename, full_path in orphans]
+        with connection.cursor() as cursor:
+            cursor.execute("delete from image_store where path = any(%s)", [orphan_paths])
+            cursor.execute("delete from image_cleanup_queue where path = any(%s)", [orphan_paths])
+        self.stdout.write("Deleted {0} orphan images, {1} bytes reclaimed.".format(removed, orphan_bytes))
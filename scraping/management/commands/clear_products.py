@@ -4,6 +4,7 @@ from django.core.management import BaseCommand
 from django.db.models import Q
 
 from backend.models import Product
+from backend.utils import delete_products
 
 
 class Command(BaseCommand):
@@ -11,6 +12,6 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         products = Product.objects.filter(Q(image_filename__isnull=True) | Q(status=404))
-        products.delete()
+        delete_products(products.values_list('id', flat=True))
         logger = logging.getLogger(__name__)
         logger.info('Unavailable products are deleted.')
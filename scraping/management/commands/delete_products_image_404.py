@@ -1,17 +1,31 @@
+import logging
 import os
 
+from django.conf import settings
 from django.core.management import BaseCommand
 
 from backend.models import Product
+from backend.utils import delete_products
 
 
 class Command(BaseCommand):
     help = "Delete products can't find image"
 
     def handle(self, *args, **options):
-        products = Product.objects.all()
-        base_path = "/home/deploy/images"
-        for product in products:
-            image_path = "{}/{}".format(base_path, product.image_filename)
-            if not os.path.exists(image_path):
-                product.delete()
+        logger = logging.getLogger(__name__)
+        # One directory listing per image folder instead of one stat call per product.
+        listings = {}
+        missing_ids = []
+        products = Product.objects.values_list('id', 'image_filename').iterator(chunk_size=10000)
+        for product_id, image_filename in products:
+            directory, filename = os.path.split(image_filename or '')
+            if directory not in listings:
+                try:
+                    listings[directory] = set(os.listdir(os.path.join(settings.IMAGES_ROOT, directory)))
+                except FileNotFoundError:
+                    listings[directory] = set()
+            if filename not in listings[directory]:
+                missing_ids.append(product_id)
+
+        deleted = delete_products(missing_ids)
+        logger.info('{0} products without image deleted.'.format(deleted))
@@ -1,12 +1,45 @@
 from django.core.management import BaseCommand
 
-from scraping.models import Scraper
+from scraping.crawls import CrawlOrchestrator, run_in_process, stalest_first
+from scraping.models import Scraper, scrapyd_client
 
 
 class Command(BaseCommand):
-    help = "run all scrapers"
+    help = "run all scrapers, stalest first, through a bounded pool of concurrent crawls"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-concurrent', type=int, default=8, help='crawls running at the same time')
+        parser.add_argument('--per-domain', type=int, default=1, help='crawls running at the same time per domain')
+        parser.add_argument('--poll-interval', type=int, default=10, help='seconds between scrapyd job polls')
+        parser.add_argument('--max-poll-failures', type=int, default=30,
+                            help='consecutive failed scrapyd polls before the run gives up')
+        parser.add_argument('--inprocess', action='store_true', help='crawl in this process instead of scrapyd')
 
     def handle(self, *args, **options):
-        scrapers = Scraper.objects.all()
-        for scraper in scrapers:
-            scraper.start()
+        scrapers = Scraper.objects.select_related('site')
+        if options['inprocess']:
+            self.handle_inprocess(scrapers, options)
+            return
+        orchestrator = CrawlOrchestrator(
+            scrapyd_client(),
+            max_concurrent=options['max_concurrent'],
+            per_domain=options['per_domain'],
+            poll_interval=options['poll_interval'],
+            max_poll_failures=options['max_poll_failures'],
+        )
+        summary = orchestrator.run(scrapers)
+
+        self.stdout.write("{0} crawls scheduled, {1} finished, {2} lost by scrapyd, {3} failed to schedule, "
+                          "{4} skipped in {5:.0f}s.".format(summary['scheduled'], summary['finished'], summary['lost'],
+                                                            summary['failed'], summary['skipped'], summary['elapsed']))
+        slowest = sorted(summary['durations'].items(), key=lambda item: item[1], reverse=True)[:5]
+        for spider_name, duration in slowest:
+            self.stdout.write("  {0}: {1:.0f}s".format(spider_name, duration))
+
+    def handle_inprocess(self, scrapers, options):
+        spider_names = [scraper.spider_name for scraper in stalest_first(scrapers)]
+        stats = run_in_process(spider_names, max_concurrent=options['max_concurrent'])
+        for spider_name, spider_stats in stats.items():
+            self.stdout.write("  {0}: {1}, {2} items".format(
+                spider_name, spider_stats.get('finish_reason', 'not finished'), spider_stats.get('item_scraped_count', 0)))
+        self.stdout.write("{0} crawls run in process.".format(len(stats)))
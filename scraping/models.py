@@ -1,11 +1,17 @@
 import os
+import threading
+from datetime import timedelta
 
+from django.conf import settings
 from django.contrib import admin
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Avg, OuterRef, Subquery
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from django.shortcuts import redirect
 from django.urls import reverse, path
+from django.utils import timezone
 from django.utils.html import format_html
 from django.views.static import serve
 from scrapyd_api import ScrapydAPI
@@ -14,6 +20,57 @@ from backend.models import Site
 from bigaray.settings.base import BASE_DIR
 
 
+_scrapyd = None
+
+
+def scrapyd_client():
+    global _scrapyd
+    if _scrapyd is None:
+        _scrapyd = ScrapydAPI(settings.SCRAPYD_URL)
+    return _scrapyd
+
+
+class JobStatuses:
+    """Statuses of all scrapyd jobs, fetched with a single listjobs call on first lookup."""
+
+    def __init__(self, project='default'):
+        self.project = project
+        self.statuses = None
+
+    def get(self, task_id):
+        if self.statuses is None:
+            self.statuses = {}
+            jobs = scrapyd_client().list_jobs(self.project)
+            for state in ('pending', 'running', 'finished'):
+                for job in jobs.get(state, []):
+                    self.statuses[job['id']] = state
+        return self.statuses.get(task_id, '')
+
+
+class JobStatusAdminMixin:
+    """Answers the spider_status column of a changelist page from one JobStatuses lookup."""
+
+    job_statuses = threading.local()
+
+    def changelist_view(self, request, extra_context=None):
+        self.job_statuses.current = JobStatuses()
+        try:
+            response = super().changelist_view(request, extra_context)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        finally:
+            self.job_statuses.current = None
+
+    def spider_status(self, obj):
+        statuses = getattr(self.job_statuses, 'current', None)
+        if statuses is None or not obj.task_id:
+            return obj.spider_status()
+        return statuses.get(obj.task_id)
+
+    spider_status.short_description = "Spider status"
+
+
 def scraper_path(instance, filename):
     return "spiders/{0}".format(filename)
 
@@ -38,13 +95,16 @@ class Scraper(models.Model):
     class Meta:
         ordering = ['site__name']
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.scrapyd = ScrapydAPI("http://localhost:6800")
+    @property
+    def scrapyd(self):
+        return scrapyd_client()
+
+    @property
+    def spider_name(self):
+        return "{}_{}_{}".format(self.site.name, self.site.gender, self.site.type)
 
     def start(self):
-        spider_name = "{}_{}_{}".format(self.site.name, self.site.gender, self.site.type)
-        self.task_id = self.scrapyd.schedule("default", spider_name)
+        self.task_id = self.scrapyd.schedule("default", self.spider_name)
         self.save()
 
     def stop(self):
@@ -64,6 +124,46 @@ def submission_delete(sender, instance, **kwargs):
     instance.file.delete(False)
 
 
+class CrawlRun(models.Model):
+    scraper = models.ForeignKey(Scraper, null=True, blank=True, on_delete=models.SET_NULL, related_name='crawl_runs')
+    spider_name = models.CharField(max_length=255)
+    finish_reason = models.CharField(max_length=255, null=True, blank=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField()
+    duration = models.FloatField(default=0)
+
+    items_scraped = models.IntegerField(default=0)
+    items_inserted = models.IntegerField(default=0)
+    items_updated = models.IntegerField(default=0)
+    items_skipped = models.IntegerField(default=0)
+    images_downloaded = models.IntegerField(default=0)
+    image_cache_hits = models.IntegerField(default=0)
+    response_bytes = models.BigIntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    items_per_second = models.FloatField(default=0)
+    bytes_per_second = models.FloatField(default=0)
+    stats = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+
+    class Meta:
+        db_table = 'crawl_runs'
+        ordering = ['-finished_at']
+        indexes = [
+            models.Index(fields=['scraper', '-finished_at'], name='crawl_runs_scraper_idx'),
+        ]
+
+    def __str__(self):
+        return '{0} - {1}'.format(self.spider_name, self.finished_at)
+
+
+class CrawlRunAdmin(admin.ModelAdmin):
+    list_display = ('spider_name', 'finished_at', 'finish_reason', 'duration', 'items_scraped', 'items_inserted',
+                    'items_updated', 'items_skipped', 'image_cache_hits', 'error_count', 'items_per_second',
+                    'bytes_per_second',)
+    list_filter = ('finish_reason',)
+    search_fields = ('spider_name',)
+    readonly_fields = [field.name for field in CrawlRun._meta.fields]
+
+
 def start_selected(modeladmin, request, queryset):
     for obj in queryset:
         obj.start()
@@ -72,11 +172,38 @@ def start_selected(modeladmin, request, queryset):
 start_selected.short_description = "Start"
 
 
-class ScraperAdmin(admin.ModelAdmin):
-    list_display = ('id', 'site', 'file', 'last_scraped', 'spider_status', 'spider_log', 'site_actions',)
-    readonly_fields = ('last_scraped', 'spider_status', 'spider_log', 'site_actions',)
+class ScraperAdmin(JobStatusAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'site', 'file', 'last_scraped', 'spider_status', 'throughput', 'throughput_trend',
+                    'spider_log', 'site_actions',)
+    readonly_fields = ('last_scraped', 'spider_status', 'throughput', 'throughput_trend', 'spider_log',
+                       'site_actions',)
     actions = [start_selected]
 
+    def get_queryset(self, request):
+        runs = CrawlRun.objects.filter(scraper=OuterRef('pk'))
+        recent_runs = runs.filter(finished_at__gte=timezone.now() - timedelta(days=30)).order_by().values('scraper')
+        return super().get_queryset(request).select_related('site').annotate(
+            last_items_per_second=Subquery(runs.values('items_per_second')[:1]),
+            last_bytes_per_second=Subquery(runs.values('bytes_per_second')[:1]),
+            average_items_per_second=Subquery(
+                recent_runs.annotate(average=Avg('items_per_second')).values('average')),
+        )
+
+    def throughput(self, obj):
+        if obj.last_items_per_second is None:
+            return '-'
+        return '{0:.1f} items/s, {1:.0f} KB/s'.format(obj.last_items_per_second, obj.last_bytes_per_second / 1024)
+
+    throughput.short_description = "Last run"
+
+    def throughput_trend(self, obj):
+        if obj.last_items_per_second is None or not obj.average_items_per_second:
+            return '-'
+        change = (obj.last_items_per_second / obj.average_items_per_second - 1) * 100
+        return '{0:+.0f}% vs 30 days'.format(change)
+
+    throughput_trend.short_description = "Trend"
+
     def start_scraping(self, request, object_id, *args, **kwargs):
         scraper = self.get_object(request, object_id)
         scraper.start()
@@ -89,9 +216,8 @@ class ScraperAdmin(admin.ModelAdmin):
 
     def serve_spider_log(self, request, object_id, *args, **kwargs):
         scraper = self.get_object(request, object_id)
-        spider_name = "{}_{}_{}".format(scraper.site.name, scraper.site.gender, scraper.site.type)
         task_id = scraper.task_id
-        log_path = "{}/logs/default/{}/{}.log".format(BASE_DIR, spider_name, task_id)
+        log_path = "{}/logs/default/{}/{}.log".format(BASE_DIR, scraper.spider_name, task_id)
         return serve(request, os.path.basename(log_path), os.path.dirname(log_path))
 
     def get_urls(self):
@@ -136,9 +262,9 @@ class ProductChecker(models.Model):
 
     last_scraped = models.DateTimeField(null=True)
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.scrapyd = ScrapydAPI("http://localhost:6800")
+    @property
+    def scrapyd(self):
+        return scrapyd_client()
 
     def start(self):
         self.task_id = self.scrapyd.schedule("default", self.name)
@@ -156,7 +282,7 @@ class ProductChecker(models.Model):
             return "-"
 
 
-class ProductCheckerAdmin(admin.ModelAdmin):
+class ProductCheckerAdmin(JobStatusAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'file', 'last_scraped', 'spider_status', 'spider_log', 'site_actions',)
     readonly_fields = ('last_scraped', 'spider_status', 'spider_log', 'site_actions',)
     actions = [start_selected]
@@ -0,0 +1,64 @@
+from datetime import timezone as dt_timezone
+
+from django.utils import timezone
+from scrapy import signals
+
+from scraping.models import Scraper, CrawlRun
+
+
+def utc_datetime(value):
+    # Older Scrapy versions record naive UTC times.
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+class CrawlRunStats:
+    """Stores the crawler stats and pipeline counters of every finished crawl as a CrawlRun."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_closed(self, spider, reason):
+        stats = self.stats.get_stats()
+        started_at = utc_datetime(stats.get('start_time'))
+        finished_at = utc_datetime(stats.get('finish_time')) or timezone.now()
+        duration = stats.get('elapsed_time_seconds')
+        if duration is None:
+            duration = (finished_at - started_at).total_seconds() if started_at else 0
+        items_scraped = stats.get('item_scraped_count', 0)
+        response_bytes = stats.get('downloader/response_bytes', 0)
+
+        CrawlRun.objects.create(
+            scraper=self.find_scraper(spider.name),
+            spider_name=spider.name,
+            finish_reason=reason,
+            started_at=started_at,
+            finished_at=finished_at,
+            duration=duration,
+            items_scraped=items_scraped,
+            items_inserted=stats.get('products/inserted', 0),
+            items_updated=stats.get('products/updated', 0),
+            items_skipped=stats.get('item_dropped_count', 0),
+            images_downloaded=stats.get('file_status_count/downloaded', 0),
+            image_cache_hits=stats.get('images/cache_hit', 0),
+            response_bytes=response_bytes,
+            error_count=stats.get('log_count/ERROR', 0),
+            items_per_second=items_scraped / duration if duration else 0,
+            bytes_per_second=response_bytes / duration if duration else 0,
+            stats=stats,
+        )
+
+    def find_scraper(self, spider_name):
+        site_keys = spider_name.split('_')
+        try:
+            return Scraper.objects.get(site__name=site_keys[0], site__gender=int(site_keys[1]),
+                                       site__type=int(site_keys[2]))
+        except (Scraper.DoesNotExist, IndexError, ValueError):
+            return None
@@ -11,6 +11,7 @@ class ProductItem(scrapy.Item):
     title = scrapy.Field()
     image_urls = scrapy.Field()
     images = scrapy.Field()
+    image_derivatives = scrapy.Field()
     price = scrapy.Field()
     sale_price = scrapy.Field()
     product_link = scrapy.Field()
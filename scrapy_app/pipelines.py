@@ -5,89 +5,320 @@
 
 
 # useful for handling different item types with a single interface
+import hashlib
 import logging
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
 from io import BytesIO
 
 from PIL import Image
+from django.db import transaction
+from django.utils import timezone
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
 from scrapy.pipelines.images import ImagesPipeline, ImageException
 from scrapy_selenium import SeleniumRequest
+from twisted.internet import defer
+from twisted.python import failure
 
-from backend.models import Site, Product
+from backend.images import product_image_paths, change_image_refs
+from backend.models import Site, Product, ImageSource
+from backend.utils import delete_products, record_product_checks, invalidate_feed_pages
 
 
 class ProductPipeline:
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
+    """Buffers scraped products and upserts them on product_link in batches."""
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.products = {}
+        self.site = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(batch_size=crawler.settings.getint('PRODUCT_PIPELINE_BATCH_SIZE', 500))
+
+    def open_spider(self, spider):
         site_name_gender_type = spider.name
         site_keys = site_name_gender_type.split('_')
-        site_name = site_keys[0]
-        site_gender = site_keys[1]
-        site_type = site_keys[2]
         try:
-            site = Site.objects.get(name=site_name, gender=site_gender, type=site_type)
-            title = adapter.get('title')
-            price = adapter.get('price')
-            sale_price = adapter.get('sale_price')
-            images = adapter.get('images')
-            image_filename = None
+            self.site = Site.objects.get(name=site_keys[0], gender=site_keys[1], type=site_keys[2])
+        except (Site.DoesNotExist, IndexError, ValueError):
+            spider.logger.error("Site {} does not exist, scraped products will be dropped.".format(
+                site_name_gender_type))
+
+    def process_item(self, item, spider):
+        if self.site is None:
+            raise DropItem("Site {} does not exist".format(spider.name))
+        adapter = ItemAdapter(item)
+        images = adapter.get('images')
+        image_filename = None
+        hq_image_filename = None
+        if len(images) == 1:
+            image_filename = images[0].get('path')
             hq_image_filename = None
-            if len(images) == 1:
-                image_filename = images[0].get('path')
-                hq_image_filename = None
-            elif len(images) == 2:
-                image_filename = images[0].get('path')
-                hq_image_filename = images[1].get('path')
-            product_link = adapter.get('product_link')
-            try:
-                product = Product.objects.get(site=site, product_link=product_link)
-                product.price = price
-                product.sale_price = sale_price
-                product.image_filename = image_filename
-                product.hq_image_filename = hq_image_filename
-                product.product_link = product_link
-                product.save()
-                print("Product: {} updated.".format(title))
-            except Product.DoesNotExist:
-                Product.objects.create(
-                    title=title,
-                    price=price, sale_price=sale_price,
-                    image_filename=image_filename, hq_image_filename=hq_image_filename,
-                    product_link=product_link, site=site
-                )
-                print("Product: {} added.".format(title))
-            except Product.MultipleObjectsReturned:
-                products = Product.objects.filter(site=site, product_link=product_link)
-                products.delete()
-                print("Multiple object returned and deleted.")
-                Product.objects.create(
-                    title=title,
-                    price=price, sale_price=sale_price,
-                    image_filename=image_filename, hq_image_filename=hq_image_filename,
-                    product_link=product_link, site=site
-                )
-                print("Product: {} added.".format(title))
-        except Site.DoesNotExist:
-            print("{} does not exist".format(site_name_gender_type))
+        elif len(images) == 2:
+            image_filename = images[0].get('path')
+            hq_image_filename = images[1].get('path')
+        product_link = adapter.get('product_link')
+        # Keyed by link: one INSERT ... ON CONFLICT can't touch the same row twice.
+        self.products[product_link] = Product(
+            title=adapter.get('title'),
+            price=adapter.get('price'), sale_price=adapter.get('sale_price'),
+            image_filename=image_filename, hq_image_filename=hq_image_filename,
+            image_derivatives=adapter.get('image_derivatives'),
+            product_link=product_link, site=self.site
+        )
+        if len(self.products) >= self.batch_size:
+            self.flush(spider)
         return item
 
+    def close_spider(self, spider):
+        self.flush(spider)
+        invalidate_feed_pages()
+
+    def flush(self, spider):
+        if not self.products:
+            return
+        products = list(self.products.values())
+        self.products = {}
+        image_refs = Counter()
+        for product in products:
+            image_refs.update(product_image_paths(
+                product.image_filename, product.hq_image_filename, product.image_derivatives))
+        with transaction.atomic():
+            # Old references are read under row locks and released in the same transaction as the
+            # upsert, so a concurrent delete can't release them a second time.
+            existing = Product.objects.filter(
+                product_link__in=[product.product_link for product in products]).order_by('id').select_for_update()
+            updated = 0
+            for image_filename, hq_image_filename, image_derivatives in existing.values_list(
+                    'image_filename', 'hq_image_filename', 'image_derivatives'):
+                image_refs.subtract(product_image_paths(image_filename, hq_image_filename, image_derivatives))
+                updated += 1
+            Product.objects.bulk_create(
+                products,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['product_link'],
+                update_fields=['price', 'sale_price', 'image_filename', 'hq_image_filename', 'image_derivatives',
+                               'updated_at'],
+            )
+            change_image_refs(image_refs)
+        spider.crawler.stats.inc_value('products/inserted', len(products) - updated)
+        spider.crawler.stats.inc_value('products/updated', updated)
+        spider.logger.info("{} products upserted.".format(len(products)))
+
 
 class ProductUpdatePipeline:
+    """Buffers checker results and applies them with one statement per status value."""
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.statuses = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(batch_size=crawler.settings.getint('PRODUCT_UPDATE_BATCH_SIZE', 500))
+
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
-        product_link = adapter.get('product_link')
-        status = adapter.get('status')
-        try:
-            products = Product.objects.filter(product_link=product_link)
+        self.statuses[adapter.get('product_link')] = adapter.get('status')
+        if len(self.statuses) >= self.batch_size:
+            self.flush(spider)
+        return item
+
+    def close_spider(self, spider):
+        self.flush(spider)
+        invalidate_feed_pages()
+
+    def flush(self, spider):
+        if not self.statuses:
+            return
+        links_by_status = {}
+        for product_link, status in self.statuses.items():
+            links_by_status.setdefault(status, []).append(product_link)
+        self.statuses = {}
+
+        for status, product_links in links_by_status.items():
             if status == 404:
-                products.delete()
+                product_ids = Product.objects.filter(product_link__in=product_links).values_list('id', flat=True)
+                deleted = delete_products(product_ids)
+                spider.logger.info("{} unavailable products deleted.".format(deleted))
             else:
-                for product in products:
-                    product.status = status
-                    product.save()
-        except Product.DoesNotExist:
-            logger = logging.getLogger(__name__)
-            logger.warning("Product doesn't exist: {}".format(product_link))
+                updated = record_product_checks(product_links, status)
+                if updated < len(product_links):
+                    logger = logging.getLogger(__name__)
+                    logger.warning("{} checked products don't exist.".format(len(product_links) - updated))
+
+
+def make_image_derivatives(store, source_path, widths, formats, quality):
+    """Write resized copies of a stored image, runs in a worker process.
+
+    Returns {format: {width: path}} with paths relative to the store.
+    """
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    os.makedirs(os.path.join(store, 'derivatives'), exist_ok=True)
+    derivatives = {}
+    with Image.open(os.path.join(store, source_path)) as source:
+        source_width, source_height = source.size
+        sizes = [width for width in widths if width <= source_width] or [source_width]
+        rgb_source = None
+        for image_format in formats:
+            paths = {}
+            for width in sizes:
+                path = 'derivatives/{0}-{1}.{2}'.format(name, width, image_format)
+                paths[str(width)] = path
+                # Paths derive from the content hash, an existing file is already up to date.
+                if os.path.exists(os.path.join(store, path)):
+                    continue
+                if rgb_source is None:
+                    rgb_source = source.convert('RGB')
+                height = round(source_height * width / source_width)
+                rgb_source.resize((width, height), Image.LANCZOS).save(
+                    os.path.join(store, path), image_format.upper(), quality=quality)
+            derivatives[image_format] = paths
+    return derivatives
+
+
+def deferred_from_future(future):
+    """Fire a Deferred on the reactor thread once a concurrent.futures future completes.
+
+    Unlike deferToThread(future.result) no reactor pool thread is parked while the future runs.
+    """
+    from twisted.internet import reactor
+
+    dfd = defer.Deferred()
+
+    def resolve(completed):
+        try:
+            result = completed.result()
+        except Exception as e:
+            dfd.errback(failure.Failure(e))
+        else:
+            dfd.callback(result)
+
+    future.add_done_callback(lambda completed: reactor.callFromThread(resolve, completed))
+    return dfd
+
+
+class ResponsiveImagesPipeline(ImagesPipeline):
+    """ImagesPipeline that also stores width-bucketed WebP/AVIF copies of each product image."""
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        settings = spider.crawler.settings
+        self.single_source = settings.getbool('IMAGES_SINGLE_SOURCE')
+        self.derivative_store = settings.get('IMAGES_STORE')
+        self.derivative_widths = settings.getlist('IMAGES_DERIVATIVE_WIDTHS', [200, 400, 800])
+        self.derivative_quality = settings.getint('IMAGES_DERIVATIVE_QUALITY', 80)
+        self.derivative_formats = []
+        Image.init()
+        for image_format in settings.getlist('IMAGES_DERIVATIVE_FORMATS', ['webp']):
+            # registered_extensions() also lists formats Pillow can only read.
+            if image_format.upper() in Image.SAVE:
+                self.derivative_formats.append(image_format)
+            else:
+                spider.logger.warning("Pillow can't write {0}, skipping those derivatives.".format(image_format))
+        # Forking would copy the reactor threads and the open database connection into the workers.
+        self.derivative_pool = ProcessPoolExecutor(max_workers=settings.getint('IMAGES_DERIVATIVE_WORKERS', 2),
+                                                   mp_context=multiprocessing.get_context('spawn'))
+        self.image_sources = {}
+
+    def close_spider(self, spider):
+        self.derivative_pool.shutdown()
+        self.flush_image_sources()
+
+    def flush_image_sources(self):
+        if not self.image_sources:
+            return
+        image_sources = list(self.image_sources.values())
+        self.image_sources = {}
+        ImageSource.objects.bulk_create(
+            image_sources,
+            update_conflicts=True,
+            unique_fields=['url'],
+            update_fields=['path', 'checksum', 'etag', 'last_modified', 'updated_at'],
+        )
+
+    def file_path(self, request, response=None, info=None, *, item=None):
+        # Stored images are addressed by content, identical images from different urls share one file.
+        if response is None:
+            return super().file_path(request, response=response, info=info, item=item)
+        return 'full/{0}.jpg'.format(hashlib.sha1(response.body).hexdigest())
+
+    def get_media_requests(self, item, info):
+        requests = super().get_media_requests(item, info)
+        if self.single_source:
+            requests = requests[-1:]
+        image_sources = ImageSource.objects.filter(url__in=[request.url for request in requests])
+        image_sources = {image_source.url: image_source for image_source in image_sources}
+        for request in requests:
+            image_source = image_sources.get(request.url)
+            if image_source is None or not os.path.exists(os.path.join(self.derivative_store, image_source.path)):
+                continue
+            request.meta['image_source'] = image_source
+            if image_source.etag:
+                request.headers['If-None-Match'] = image_source.etag
+            if image_source.last_modified:
+                request.headers['If-Modified-Since'] = image_source.last_modified
+        return requests
+
+    def media_to_download(self, request, info, *, item=None):
+        # Without validators a stored image can't be revalidated, keep it until IMAGES_EXPIRES like
+        # the stock pipeline does and download it again after that.
+        image_source = request.meta.get('image_source')
+        if image_source and not image_source.etag and not image_source.last_modified \
+                and image_source.updated_at > timezone.now() - timedelta(days=self.expires):
+            info.spider.crawler.stats.inc_value('images/cache_hit')
+            return self.image_source_result(image_source)
+        return None
+
+    def media_downloaded(self, response, request, info, *, item=None):
+        image_source = request.meta.get('image_source')
+        if response.status == 304 and image_source:
+            info.spider.crawler.stats.inc_value('images/cache_hit')
+            return self.image_source_result(image_source)
+        result = super().media_downloaded(response, request, info, item=item)
+        self.image_sources[request.url] = ImageSource(
+            url=request.url, path=result['path'], checksum=result['checksum'],
+            etag=response.headers.get('ETag', b'').decode('latin-1') or None,
+            last_modified=response.headers.get('Last-Modified', b'').decode('latin-1') or None,
+        )
+        if len(self.image_sources) >= 500:
+            self.flush_image_sources()
+        return result
+
+    def image_source_result(self, image_source):
+        return {'url': image_source.url, 'path': image_source.path, 'checksum': image_source.checksum,
+                'status': 'uptodate'}
+
+    def item_completed(self, results, item, info):
+        item = super().item_completed(results, item, info)
+        adapter = ItemAdapter(item)
+        images = adapter.get('images') or []
+        if self.single_source and len(images) == 1:
+            # Small and hq image are the same file, the derivatives cover the smaller sizes.
+            adapter['images'] = [images[0], images[0]]
+        if not images or not self.derivative_formats:
+            return item
+        future = self.derivative_pool.submit(
+            make_image_derivatives, self.derivative_store, images[-1]['path'],
+            [int(width) for width in self.derivative_widths], self.derivative_formats, self.derivative_quality)
+        dfd = deferred_from_future(future)
+        dfd.addCallback(self.derivatives_completed, item)
+        dfd.addErrback(self.derivatives_failed, item, info)
+        return dfd
+
+    def derivatives_completed(self, derivatives, item):
+        ItemAdapter(item)['image_derivatives'] = derivatives
+        return item
+
+    def derivatives_failed(self, failure, item, info):
+        info.spider.logger.warning("Image derivatives failed: {0}".format(failure.getErrorMessage()))
         return item
 
 
@@ -58,13 +58,18 @@ DOWNLOADER_MIDDLEWARES = {
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
 EXTENSIONS = {
     'scrapy.extensions.telnet.TelnetConsole': 6023,
+    'scrapy_app.extensions.CrawlRunStats': 500,
 }
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     'scrapy_app.pipelines.ProductPipeline': 300,
-    'scrapy.pipelines.images.ImagesPipeline': 1,
+    'scrapy_app.pipelines.ResponsiveImagesPipeline': 1,
 }
+# Number of products ProductPipeline buffers before writing them in one upsert
+PRODUCT_PIPELINE_BATCH_SIZE = 500
+# Number of checker results ProductUpdatePipeline buffers before applying them
+PRODUCT_UPDATE_BATCH_SIZE = 500
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -87,5 +92,13 @@ ITEM_PIPELINES = {
 # HTTPCACHE_IGNORE_HTTP_CODES = []
 # HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
 IMAGES_STORE = '/home/deploy/images'
+# Resized copies ResponsiveImagesPipeline writes under IMAGES_STORE/derivatives for srcset
+IMAGES_DERIVATIVE_WIDTHS = [200, 400, 800]
+# 'avif' needs a Pillow build with AVIF support and is skipped otherwise
+IMAGES_DERIVATIVE_FORMATS = ['webp']
+IMAGES_DERIVATIVE_QUALITY = 80
+IMAGES_DERIVATIVE_WORKERS = 2
+# Download only the last (largest) image url and derive every size from it
+IMAGES_SINGLE_SOURCE = False
 
 
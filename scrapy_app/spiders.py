@@ -0,0 +1,72 @@
+import scrapy
+from django.utils import timezone
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+from scrapy import signals
+
+from scraping.models import Scraper
+from scrapy_app.items import ProductItem
+
+
+def compile_css(css):
+    """Translate a CSS selector, ::text and ::attr() included, into a compiled lxml XPath once."""
+    return etree.XPath(HTMLTranslator().css_to_xpath(css))
+
+
+def first_text(xpath, node):
+    results = xpath(node)
+    return str(results[0]) if results else None
+
+
+class BaseProductSpider(scrapy.Spider):
+    """Spider for product listing pages, described by CSS selectors instead of a parse loop.
+
+    selectors maps 'tile' to the selector of one product on a listing page and 'title', 'price',
+    'sale_price', 'link', 'image' and 'hq_image' to selectors relative to that tile; 'sale_price'
+    and 'hq_image' are optional. Tiles missing a title, price, link or image are skipped.
+    Override image_urls to derive the image urls from the scraped ones, or parse for non-HTML sites.
+    """
+    selectors = {}
+    link_prefix = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compiled_selectors = {field: compile_css(css) for field, css in self.selectors.items()}
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
+        return spider
+
+    def spider_closed(self, spider, reason):
+        site_keys = spider.name.split('_')
+        Scraper.objects.filter(site__name=site_keys[0], site__gender=int(site_keys[1]),
+                               site__type=int(site_keys[2])).update(last_scraped=timezone.now())
+
+    def parse(self, response, **kwargs):
+        for tile in self.compiled_selectors['tile'](response.selector.root):
+            item = self.parse_tile(tile, response)
+            if item is not None:
+                yield item
+
+    def parse_tile(self, tile, response):
+        values = {field: first_text(xpath, tile) for field, xpath in self.compiled_selectors.items() if field != 'tile'}
+        title, price, link, image_url = (values.get(field) for field in ('title', 'price', 'link', 'image'))
+        if not title or not price or not link or not image_url:
+            return None
+        item = ProductItem()
+        item['title'] = title.strip()
+        item['price'] = price.strip()
+        if values.get('sale_price'):
+            item['sale_price'] = values['sale_price'].strip()
+        item['image_urls'] = self.image_urls(image_url, values.get('hq_image'), response)
+        if self.link_prefix is not None:
+            item['product_link'] = self.link_prefix + link
+        else:
+            item['product_link'] = response.urljoin(link)
+        return item
+
+    def image_urls(self, image_url, hq_image_url, response):
+        image_url = response.urljoin(image_url)
+        return [image_url, response.urljoin(hq_image_url) if hq_image_url else image_url]
@@ -1,15 +1,12 @@
 from shutil import which
 
-import scrapy
-from django.utils import timezone
-from scrapy import signals
 from scrapy_selenium import SeleniumRequest
 
-from scraping.models import Scraper
-from scrapy_app.items import ProductItem
+from scrapy_app.spiders import BaseProductSpider
 from . import get_scraperapi_url_ultra_premium_renderJS
 
-class ProductSpider(scrapy.Spider):
+
+class ProductSpider(BaseProductSpider):
     name = 'Banana-republic_1_1'  # name_gender_type
     allowed_domains = ['bananarepublic.gapcanada.ca']
     start_urls = [
@@ -32,62 +29,16 @@ class ProductSpider(scrapy.Spider):
     #     }
     # }
 
-    @classmethod
-    def from_crawler(cls, crawler, *args, **kwargs):
-        spider = super(ProductSpider, cls).from_crawler(crawler, *args, **kwargs)
-        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
-        return spider
-
-    def spider_closed(self, spider, reason):
-        a = spider.name.split('_')
-        try:
-            scraper = Scraper.objects.get(site__name=a[0], site__gender=int(a[1]), site__type=int(a[2]))
-            scraper.last_scraped = timezone.now()
-            scraper.save()
-        except Scraper.DoesNotExist:
-            pass
+    # The rendered product cards link to their pages with absolute urls.
+    link_prefix = ''
+    selectors = {
+        'tile': '.product-card',
+        'title': '.product-card__name::text',
+        'price': '.product-card-price > div > span > span::text',
+        'image': 'img.product-card__image::attr(src)',
+        'link': '.product-card__link::attr(href)',
+    }
 
     def start_requests(self):
         for url in self.start_urls:
             yield SeleniumRequest(url=url)
-
-    # def parse(self, response, **kwargs):
-    #     products = response.css('.product-card')
-        
-    #     for product in products:
-    #         title = product.css('.product-card__name::text').get()
-    #         price = product.css('.product-card-price > div > span > span::text').get()
-    #         image_url = product.css('img.product-card__image::attr(src)').get()
-    #         product_link = product.css('.product-card__link::attr(href)').get()
-
-    #         if title and price and image_url and product_link:
-    #             item = ProductItem()
-    #             item['title'] = title
-    #             item['price'] = price
-    #             if image_url:
-    #                 item['image_urls'] = [image_url, image_url]
-    #             else:
-    #                 continue
-    #             item['product_link'] = product_link
-    #             yield item
-
-
-    # def parse(self, response):
-    #     product_cards = response.css('.product-card.category-page-uzkda7')
-
-    #     for card in product_cards:
-    #         title = card.css('.category-page-xp1t5v::text').get()
-    #         price = card.css('.category-page-1gb60o9 span span::text').get()
-    #         image_url = card.css('.cat_product-image.category-page-1ka9lu7 img::attr(src)').get()
-    #         product_link = card.css('.cat_product-image.category-page-1ka9lu7 a::attr(href)').get()
-
-    #         if title and price and image_url and product_link:
-    #             item = ProductItem()
-    #             item['title'] = title
-    #             item['price'] = price
-    #             if image_url:
-    #                 item['image_urls'] = [image_url, image_url]
-    #             else:
-    #                 continue
-    #             item['product_link'] = product_link
-    #             yield item
\ No newline at end of file
@@ -1,60 +1,25 @@
-import scrapy
-from django.utils import timezone
-from scrapy import signals
+from scrapy_app.spiders import BaseProductSpider
 
-from scraping.models import Scraper
-from scrapy_app.items import ProductItem
 
-
-class ProductSpider(scrapy.Spider):
+class ProductSpider(BaseProductSpider):
     name = 'Diesel_1_2'  # name_gender_type
     allowed_domains = ['ca.diesel.com']
-    root_path = 'https://ca.diesel.com'
     start_urls = [
         'https://ca.diesel.com/en/sale-woman-ca/?lang=en&prefn1=gender&prefv1=Female&start=%start&sz=60' % start for start in range(0, 380, 60)
     ]
-
-    @classmethod
-    def from_crawler(cls, crawler, *args, **kwargs):
-        spider = super(ProductSpider, cls).from_crawler(crawler, *args, **kwargs)
-        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
-        return spider
-
-    def spider_closed(self, spider, reason):
-        a = spider.name.split('_')
-        try:
-            scraper = Scraper.objects.get(site__name=a[0], site__gender=int(a[1]), site__type=int(a[2]))
-            scraper.last_scraped = timezone.now()
-            scraper.save()
-        except Scraper.DoesNotExist:
-            pass
-
- 
-    def parse(self, response, **kwargs):
-        products = response.css('.js_tile')
-        
-        for idx, product in enumerate(products):
-            item = ProductItem()
-            item['title'] = product.css('.product-tile-body__link::text').get()   
-            price = product.xpath('//div[contains(@class, "product-tile-body__price")]/span[contains(@class, "value")]/text()').get()            
-            if price:
-                item['price'] = price.strip()
-            else:
-                continue
-
-            image_url = product.css('source::attr(data-srcset)').get()
-            if image_url:
-                b = image_url.split('.jpg?')
-                c = b[1]
-                d = c.split('&')
-                sw = int((d[0].split("sw="))[1])
-                sh = int((d[1].split("sh="))[1])
-                hq_image_url = "{0}.jpg?sw={1}&sh={2}".format(b[0], sw * 2, sh * 2)
-                item['image_urls'] = [image_url, hq_image_url]
-            else:
-                continue
-
-            product_link = product.css('.tile-image-link::attr(href)').get()
-            item['product_link'] = self.root_path + product_link
-
-            yield item
+    link_prefix = 'https://ca.diesel.com'
+    selectors = {
+        'tile': '.js_tile',
+        'title': '.product-tile-body__link::text',
+        'price': '.product-tile-body__price span.value::text',
+        'image': 'source::attr(data-srcset)',
+        'link': '.tile-image-link::attr(href)',
+    }
+
+    def image_urls(self, image_url, hq_image_url, response):
+        # The high quality image is the same one at twice the sw/sh size.
+        path, query = image_url.split('.jpg?')
+        params = query.split('&')
+        sw = int(params[0].split('sw=')[1])
+        sh = int(params[1].split('sh=')[1])
+        return [image_url, '{0}.jpg?sw={1}&sh={2}'.format(path, sw * 2, sh * 2)]
@@ -1,72 +1,28 @@
-import scrapy
-from django.utils import timezone
-from scrapy import signals
+from scrapy_app.spiders import BaseProductSpider
+from . import get_scraperapi_url_ultra_premium
 
-from scraping.models import Scraper
-from scrapy_app.items import ProductItem
-from . import APIKEY, get_scraperapi_url_ultra_premium
 
-
-
-class ProductSpider(scrapy.Spider):
+class ProductSpider(BaseProductSpider):
     name = 'Freepeople_1_2'  # name_gender_type
     allowed_domains = ['www.freepeople.com']
-    root_url = 'https://www.freepeople.com'
-    start_urls = [f'https://www.freepeople.com/sale-all/?page={page}' for page in range(1, 4)]    
-    for i in range(len(start_urls)):
-        start_urls[i] = get_scraperapi_url_ultra_premium(start_urls[i])
-
+    start_urls = [get_scraperapi_url_ultra_premium(f'https://www.freepeople.com/sale-all/?page={page}')
+                  for page in range(1, 4)]
     custom_settings = {
         'USER_AGENT': None,
     }
+    link_prefix = 'https://www.freepeople.com'
+    selectors = {
+        'tile': '.o-pwa-product-tile',
+        'title': '.o-pwa-product-tile__heading::text',
+        'price': 'span.c-pwa-product-price__original::text',
+        'sale_price': 'span.c-pwa-product-price__current::text',
+        'image': 'source::attr(srcset)',
+        'link': '.o-pwa-product-tile__link::attr(href)',
+    }
 
-    @classmethod
-    def from_crawler(cls, crawler, *args, **kwargs):
-        spider = super(ProductSpider, cls).from_crawler(crawler, *args, **kwargs)
-        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
-        return spider
-
-    def spider_closed(self, spider, reason):
-        a = spider.name.split('_')
-        try:
-            scraper = Scraper.objects.get(site__name=a[0], site__gender=int(a[1]), site__type=int(a[2]))
-            scraper.last_scraped = timezone.now()
-            scraper.save()
-        except Scraper.DoesNotExist:
-            pass
-
-    def parse(self, response, **kwargs):
-        products = response.css('.o-pwa-product-tile')
-        for idx, product in enumerate(products):
-            item = ProductItem()
-            title = product.css('.o-pwa-product-tile__heading::text').get()
-            if title:
-                item['title'] = title.strip()
-            else:
-                continue
-            sale_price = product.css('span.c-pwa-product-price__current::text').get()
-            if sale_price:
-                item['sale_price'] = sale_price
-            else:
-                continue
-
-            price = product.css('span.c-pwa-product-price__original::text').get()
-            if price:
-                item['price'] = price
-            else:
-                continue
-
-            image_src_set = product.css('source::attr(srcset)').get()
-            if image_src_set:
-                b = image_src_set.split(', ')
-                c = b[0].split(' 698w')
-                d = b[1].split(' 349w')
-                image_url = d[0]
-                hq_image_url = c[0]
-                item['image_urls'] = [image_url, hq_image_url]
-            else:
-                continue
-
-            product_link = product.css('.o-pwa-product-tile__link::attr(href)').get()
-            item['product_link'] = self.root_url + product_link
-            yield item
+    def image_urls(self, image_url, hq_image_url, response):
+        # The srcset lists the 698w image first and the 349w one second.
+        sources = image_url.split(', ')
+        hq_image_url = sources[0].split(' 698w')[0]
+        image_url = sources[1].split(' 349w')[0]
+        return [image_url, hq_image_url]
@@ -1,7 +1,7 @@
-from datetime import timedelta
 from shutil import which
 
 import scrapy
+from django.db.models import Q
 from django.utils import timezone
 from scrapy_selenium import SeleniumRequest
 
@@ -28,21 +28,30 @@ class BrokenLinksSpider(scrapy.Spider):
         }
     }
 
-    def __init__(self, name=None, **kwargs):
-        super().__init__(name, **kwargs)
-        self.start_urls = []
-        time_threshold = timezone.now() - timedelta(days=0)
+    chunk_size = 1000
+
+    def product_links(self):
+        # Only products that are due, see backend.utils.record_product_checks.
+        # Keyset chunks over id: only one chunk of links is held in memory at a time.
+        now = timezone.now()
         products = Product.objects.filter(
-            inserted_at__lt=time_threshold
-        ).order_by('inserted_at')
-        for product in products:
-            if 'freepeople' in product.product_link:
-                self.start_urls.append(get_scraperapi_url_ultra_premium(product.product_link))
-            else:
-                self.start_urls.append(get_scraperapi_url(product.product_link))
+            Q(next_check_at__isnull=True) | Q(next_check_at__lte=now)
+        ).order_by('id')
+        last_id = 0
+        while True:
+            chunk = list(products.filter(id__gt=last_id).values_list('id', 'product_link')[:self.chunk_size])
+            if not chunk:
+                break
+            for product_id, product_link in chunk:
+                yield product_link
+            last_id = chunk[-1][0]
 
     def start_requests(self):
-        for url in self.start_urls:
+        for product_link in self.product_links():
+            if 'freepeople' in product_link:
+                url = get_scraperapi_url_ultra_premium(product_link)
+            else:
+                url = get_scraperapi_url(product_link)
             yield scrapy.Request(url, callback=self.parse, meta={'url': url})
             # yield SeleniumRequest(url=url)
 